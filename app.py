@@ -1,12 +1,285 @@
-from flask import Flask, request, render_template_string, session, jsonify
+from flask import Blueprint, Flask, current_app, request, render_template, session, jsonify, stream_with_context, g
+from flask import before_render_template, template_rendered
+from jinja2 import FileSystemBytecodeCache
 import requests
 from pathlib import Path
-from typing import List, Dict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import click
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
 
-app = Flask(__name__)
+from cache import canonical_query, make_cache, normalize_terms
+from http_cache import apply_http_caching, not_modified
+from http_client import CircuitBreaker, SpoonacularClient, UpstreamUnavailable
+from matching import compile_avoid_matcher
+from metrics import REGISTRY, Trace, current_trace, observe_request, propagate, record_stage, stage
+from offline import StaleResults, UpstreamHealth
+from prefetch import Prefetcher
+from profiler import SamplingProfiler
+from ratelimit import RateLimited, SQLiteTokenBucket, TokenBucket
+from recipe_index import RecipeIndex
+from recipe_model import slim
+from recipe_store import RecipeStore
+from refresh import SavedSearchRefresher
+from saved_searches import SavedSearchStore
+from suggest import load_vocabulary
+from sessions import ServerSideSessionInterface
+
+
+logger = logging.getLogger(__name__)
+bp = Blueprint('recipes', __name__, cli_group=None)
+
+# The running app's config; create_app() points this at app.config so code outside a request can read it
+config: Dict[str, Any] = {}
+startup_timings: Dict[str, float] = {}
+
+def load_config(app: Flask):
+    # Read once per process, from the environment with the defaults below
+    # Shared Spoonacular client
+    app.config.setdefault('SPOONACULAR_URL', os.environ.get('SPOONACULAR_URL', 'https://api.spoonacular.com'))
+    app.config.setdefault('SPOONACULAR_POOL_SIZE', int(os.environ.get('SPOONACULAR_POOL_SIZE', 10)))
+    app.config.setdefault('SPOONACULAR_TIMEOUT', float(os.environ.get('SPOONACULAR_TIMEOUT', 10)))
+    app.config.setdefault('SPOONACULAR_MAX_RETRIES', int(os.environ.get('SPOONACULAR_MAX_RETRIES', 3)))
+    # Points per second and burst size; set a path to share the budget between worker processes
+    app.config.setdefault('SPOONACULAR_RATE', float(os.environ.get('SPOONACULAR_RATE', 1)))
+    app.config.setdefault('SPOONACULAR_BURST', float(os.environ.get('SPOONACULAR_BURST', 10)))
+    app.config.setdefault('SPOONACULAR_RATE_LIMIT_PATH', os.environ.get('SPOONACULAR_RATE_LIMIT_PATH'))
+
+    # Serve searches and recipe pages from local data only: 'on', 'off', or 'auto' to switch over while
+    # Spoonacular is unreachable, over quota, or slower than OFFLINE_SLOW_AFTER seconds on average
+    app.config.setdefault('OFFLINE_MODE', os.environ.get('OFFLINE_MODE', 'auto'))
+    app.config.setdefault('OFFLINE_SLOW_AFTER', float(os.environ.get('OFFLINE_SLOW_AFTER', 3)))
+    app.config.setdefault('OFFLINE_MIN_QUOTA', float(os.environ.get('OFFLINE_MIN_QUOTA', 0)))
+    # How long to stay offline after a slow spell or a spent quota before calling upstream again
+    app.config.setdefault('OFFLINE_COOLDOWN', float(os.environ.get('OFFLINE_COOLDOWN', 60)))
+
+    # Search result and summary caches; 'shared' keeps them in one SQLite file used by every worker on the host
+    app.config.setdefault('SEARCH_CACHE_BACKEND', os.environ.get('SEARCH_CACHE_BACKEND', 'shared'))
+    app.config.setdefault('SEARCH_CACHE_PATH', Path(os.environ.get('SEARCH_CACHE_PATH',
+                                                                    Path(__file__).parent / 'search_cache.sqlite3')))
+    app.config.setdefault('SEARCH_CACHE_TTL', int(os.environ.get('SEARCH_CACHE_TTL', 3600)))
+    app.config.setdefault('SEARCH_CACHE_MAX_ENTRIES', int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 1000)))
+    app.config.setdefault('SUMMARY_CACHE_BACKEND', os.environ.get('SUMMARY_CACHE_BACKEND', 'shared'))
+    app.config.setdefault('SUMMARY_CACHE_PATH', Path(os.environ.get('SUMMARY_CACHE_PATH',
+                                                                     Path(__file__).parent / 'summary_cache.sqlite3')))
+    # Size budget of each shared cache file
+    app.config.setdefault('SHARED_CACHE_MAX_BYTES', int(os.environ.get('SHARED_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
+
+    # Recipe details store
+    app.config.setdefault('RECIPE_STORE_PATH', Path(os.environ.get('RECIPE_STORE_PATH',
+                                                                    Path(__file__).parent / 'recipes.sqlite3')))
+    app.config.setdefault('RECIPE_FRESH_FOR', int(os.environ.get('RECIPE_FRESH_FOR', 7 * 24 * 3600)))
+
+    # Local index over every recipe we have seen, used to answer searches without a round-trip
+    app.config.setdefault('LOCAL_SEARCH', os.environ.get('LOCAL_SEARCH', '1') == '1')
+    # Ingredient names offered by /suggest before any recipe has been seen
+    app.config.setdefault('SUGGEST_VOCABULARY', Path(os.environ.get('SUGGEST_VOCABULARY',
+                                                                     Path(__file__).parent / 'ingredients.txt')))
+
+    # Saved searches, migrated once from the old JSON file
+    app.config.setdefault('SAVED_SEARCHES_PATH', Path(os.environ.get('SAVED_SEARCHES_PATH',
+                                                                      Path(__file__).parent / 'saved_searches.sqlite3')))
+
+    # Saved searches are re-run in the background about once per period, in seconds; 0 turns this off
+    app.config.setdefault('SAVED_SEARCH_REFRESH_PERIOD', float(os.environ.get('SAVED_SEARCH_REFRESH_PERIOD', 24 * 3600)))
+    # Rate limit points to leave for user-facing requests; below this the next refresh waits
+    app.config.setdefault('SAVED_SEARCH_REFRESH_MIN_BUDGET',
+                          float(os.environ.get('SAVED_SEARCH_REFRESH_MIN_BUDGET', 20)))
+
+    # Server-side sessions; use the sqlite backend when several workers serve the app
+    app.config.setdefault('SESSION_BACKEND', os.environ.get('SESSION_BACKEND', 'sqlite'))
+    app.config.setdefault('SESSION_PATH', Path(os.environ.get('SESSION_PATH',
+                                                               Path(__file__).parent / 'sessions.sqlite3')))
+    app.config.setdefault('SESSION_MAX_ENTRIES', int(os.environ.get('SESSION_MAX_ENTRIES', 100000)))
+
+    # HTTP caching: precompress responses at least this large
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))
+
+    # Upstream calls for one page run side by side on this pool
+    app.config.setdefault('FETCH_WORKERS', int(os.environ.get('FETCH_WORKERS', 8)))
+    app.config.setdefault('BULK_CHUNK_SIZE', int(os.environ.get('BULK_CHUNK_SIZE', 50)))
+    app.config.setdefault('BULK_PARALLELISM', int(os.environ.get('BULK_PARALLELISM', 4)))
+    # Batch searches: queries run at once, and the most one request may send
+    app.config.setdefault('BATCH_PARALLELISM', int(os.environ.get('BATCH_PARALLELISM', 4)))
+    app.config.setdefault('BATCH_MAX_QUERIES', int(os.environ.get('BATCH_MAX_QUERIES', 100)))
+
+    # Details of the top search results are fetched in the background, ahead of the click
+    app.config.setdefault('PREFETCH_TOP_K', int(os.environ.get('PREFETCH_TOP_K', 5)))
+    app.config.setdefault('PREFETCH_WORKERS', int(os.environ.get('PREFETCH_WORKERS', 1)))
+    # Rate limit points to leave for user-facing requests; below this queued prefetches are cancelled
+    app.config.setdefault('PREFETCH_MIN_BUDGET', float(os.environ.get('PREFETCH_MIN_BUDGET', 5)))
+
+    # Requests slower than PROFILE_SLOW_MS leave a collapsed-stack profile in PROFILE_DIR; 0 turns sampling off
+    app.config.setdefault('PROFILE_SLOW_MS', float(os.environ.get('PROFILE_SLOW_MS', 0)))
+    app.config.setdefault('PROFILE_DIR', Path(os.environ.get('PROFILE_DIR', Path(__file__).parent / 'profiles')))
+    app.config.setdefault('PROFILE_INTERVAL', float(os.environ.get('PROFILE_INTERVAL', 0.005)))
+
+    # Load the index, stores and templates before serving, and warn when that takes longer than the budget
+    app.config.setdefault('WARM_ON_START', os.environ.get('WARM_ON_START', '1') == '1')
+    app.config.setdefault('STARTUP_BUDGET', float(os.environ.get('STARTUP_BUDGET', 2)))
+
+    # Credentials
+    env_path = Path(os.environ.get('RECIPEHUNTER_ENV', Path(__file__).parent / 'recipehunter.env'))
+    if not app.config.get('API_KEY'):
+        app.config['API_KEY'] = os.environ.get('API_KEY') or load_api_key(env_path)
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = load_secret_key(env_path, Path(__file__).parent / '.secret_key')
+
+class Service:
+    # Stand-in that builds the real object on first use, so importing the module or forking workers
+    # opens no files or sockets. Its own attributes are underscored to stay clear of the wrapped object's
+    registry: Dict[str, 'Service'] = {}
+    _build_lock = threading.RLock()
+
+    def __init__(self, builder: Callable[[], Any]):
+        self._builder = builder
+        self._instance = None
+        Service.registry[builder.__name__] = self
+
+    def _resolve(self) -> Any:
+        if self._instance is None:
+            with Service._build_lock:
+                if self._instance is None:
+                    self._instance = self._builder()
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __len__(self) -> int:
+        return len(self._resolve())
+
+def reset_services(keep: Iterable[str] = ('recipe_index',)):
+    # Called in each forked worker: connections, pools and threads from the parent are not safe to share,
+    # but in-memory data like the index is
+    with Service._build_lock:
+        for name, service in Service.registry.items():
+            if name not in keep:
+                service._instance = None
+
+@Service
+def rate_limiter():
+    if config['SPOONACULAR_RATE_LIMIT_PATH']:
+        return SQLiteTokenBucket(config['SPOONACULAR_RATE_LIMIT_PATH'],
+                                 config['SPOONACULAR_RATE'], config['SPOONACULAR_BURST'])
+    return TokenBucket(config['SPOONACULAR_RATE'], config['SPOONACULAR_BURST'])
+
+@Service
+def spoonacular():
+    return SpoonacularClient(config['SPOONACULAR_URL'],
+                             pool_size=config['SPOONACULAR_POOL_SIZE'],
+                             timeout=(3.05, config['SPOONACULAR_TIMEOUT']),
+                             max_retries=config['SPOONACULAR_MAX_RETRIES'],
+                             breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30),
+                             rate_limiter=rate_limiter)
+
+# Client the current request reaches Spoonacular through; the ASGI server points it at its async client
+current_client: ContextVar[Optional[Any]] = ContextVar('current_client', default=None)
+
+def upstream() -> Any:
+    return current_client.get() or spoonacular
+
+@Service
+def upstream_health():
+    return UpstreamHealth(spoonacular, mode=config['OFFLINE_MODE'], slow_after=config['OFFLINE_SLOW_AFTER'],
+                          min_quota=config['OFFLINE_MIN_QUOTA'], cooldown=config['OFFLINE_COOLDOWN'])
+
+@Service
+def search_cache():
+    return make_cache(config['SEARCH_CACHE_BACKEND'],
+                      path=config['SEARCH_CACHE_PATH'],
+                      ttl=config['SEARCH_CACHE_TTL'],
+                      max_entries=config['SEARCH_CACHE_MAX_ENTRIES'],
+                      max_bytes=config['SHARED_CACHE_MAX_BYTES'])
+
+@Service
+def recipe_store():
+    return RecipeStore(config['RECIPE_STORE_PATH'], fresh_for=config['RECIPE_FRESH_FOR'])
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+@Service
+def recipe_index():
+    index = RecipeIndex()
+    index.suggestions.update(load_vocabulary(config['SUGGEST_VOCABULARY']))
+    index.add_many(recipe_store.iter_details())
+    return index
+
+@Service
+def saved_search_store():
+    store = SavedSearchStore(config['SAVED_SEARCHES_PATH'])
+    store.migrate_from_json(Path(__file__).parent / 'saved_searches.json')
+    return store
+
+# Summaries already returned by complexSearch, so the detail page can skip /summary
+@Service
+def summary_cache():
+    return make_cache(config['SUMMARY_CACHE_BACKEND'], path=config['SUMMARY_CACHE_PATH'], ttl=config['SEARCH_CACHE_TTL'],
+                      max_entries=config['SEARCH_CACHE_MAX_ENTRIES'] * 10, max_bytes=config['SHARED_CACHE_MAX_BYTES'])
+
+@Service
+def session_store():
+    return make_cache(config['SESSION_BACKEND'], path=config['SESSION_PATH'],
+                      ttl=config['PERMANENT_SESSION_LIFETIME'].total_seconds(),
+                      max_entries=config['SESSION_MAX_ENTRIES'])
+
+# HTTP caching: Cache-Control per endpoint, and precompressed copies of hot pages
+CACHE_POLICIES = {
+    'recipes.recipe_details': 'public, max-age=86400, stale-while-revalidate=604800',
+    'recipes.search_stream': 'public, max-age=300',
+    'recipes.suggest': 'public, max-age=300',
+    'recipes.home': 'private, no-cache',
+    'recipes.get_saved_searches': 'private, no-cache',
+    'recipes.load_saved_search': 'private, no-cache',
+    'recipes.cache_stats': 'no-store',
+    'recipes.metrics': 'no-store',
+}
+
+@Service
+def compressed_variants():
+    return make_cache('memory', ttl=24 * 3600, max_entries=500)
+
+@Service
+def fetch_pool():
+    return ThreadPoolExecutor(max_workers=config['FETCH_WORKERS'], thread_name_prefix='fetch')
+
+@Service
+def prefetcher():
+    return Prefetcher(lambda recipe_ids: fetch_recipes_bulk(recipe_ids, config['API_KEY'], parallelism=1),
+                      is_cached=lambda recipe_id: not recipe_store.missing([recipe_id]),
+                      budget=rate_limiter.remaining,
+                      min_budget=config['PREFETCH_MIN_BUDGET'],
+                      workers=config['PREFETCH_WORKERS'],
+                      batch_size=config['PREFETCH_TOP_K'])
+
+@Service
+def saved_search_refresher():
+    def search(saved: Dict) -> List[Dict]:
+        # Cached or local results would only diff the saved search against itself
+        return saved_recipe_entries(refresh_search(saved.get('ingredients', []), saved.get('avoid', []),
+                                                   saved.get('diet', []), saved.get('intolerances', []),
+                                                   config['API_KEY']))
+
+    return SavedSearchRefresher(saved_search_store, search,
+                                fetch_details=lambda recipe_ids: fetch_recipes_bulk(recipe_ids, config['API_KEY'],
+                                                                                   parallelism=1),
+                                budget=rate_limiter.remaining,
+                                period=config['SAVED_SEARCH_REFRESH_PERIOD'] or 24 * 3600,
+                                min_budget=config['SAVED_SEARCH_REFRESH_MIN_BUDGET'],
+                                available=lambda: upstream_health.offline_reason() is None)
+
+@Service
+def profiler():
+    return SamplingProfiler(config['PROFILE_INTERVAL'])
 
 def load_api_key(env_path: Path) -> str:
     with open(env_path) as f:
@@ -15,11 +288,32 @@ def load_api_key(env_path: Path) -> str:
                 return line.strip().split('=')[-1]
     raise ValueError("API_KEY not found in .env file")
 
-def search_recipes(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str) -> List[Dict]:
+def load_secret_key(env_path: Path, key_path: Path) -> str:
+    # Every worker must sign with the same key, so it comes from the environment, the .env file,
+    # or a key file generated once and then shared
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    if env_path.exists():
+        with open(env_path) as f:
+            for line in f:
+                if line.startswith('SECRET_KEY'):
+                    return line.strip().split('=', 1)[-1]
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(key_path) as f:
+            return f.read().strip()
+    secret_key = os.urandom(32).hex()
+    with os.fdopen(fd, 'w') as f:
+        f.write(secret_key)
+    return secret_key
+
+def build_search_params(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str, number: int) -> Dict:
     params = {
         'apiKey': api_key,
-        'number': 10,  # Limit to 10 results
+        'number': number,
         'addRecipeInformation': True,  # This will include the summary in the response
+        'fillIngredients': True,  # Ingredient lists feed the avoid filter and the local index
     }
     
     if ingredients:
@@ -30,51 +324,328 @@ def search_recipes(ingredients: List[str], avoid: List[str], diet: List[str], in
         params['diet'] = ','.join(diet)
     if intolerances:
         params['intolerances'] = ','.join(intolerances)
-    
-    api_url = 'https://api.spoonacular.com/recipes/complexSearch'
-    
-    res = requests.get(api_url, params=params)
-    res.raise_for_status()
-    data = res.json()
-    
-    # Filter out recipes with avoided ingredients
-    filtered_results = []
-    for recipe in data.get('results', []):
-        if not any(ingredient.lower() in recipe['title'].lower() for ingredient in avoid):
-            filtered_results.append(recipe)
-    
+    return params
+
+def fetch_search_page(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str,
+                      offset: int, number: int, refresh: bool = False) -> Dict:
+    # refresh skips the cache on the way in and fails rather than falling back to an expired copy
+    cache_key = canonical_query(ingredients, avoid, diet, intolerances, page=[offset, number])
+    cached = None if refresh else search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    params = build_search_params(ingredients, avoid, diet, intolerances, api_key, number)
+    params['offset'] = offset
+    try:
+        # complexSearch costs one point plus a fraction per returned recipe and per filled ingredient list
+        with prefetcher.foreground():
+            data = upstream().get('recipes/complexSearch', params=params, cost=1 + 0.035 * number)
+    except (UpstreamUnavailable, RateLimited, requests.RequestException):
+        # Fall back to an expired copy of the same page rather than failing the search
+        stale = None if refresh else search_cache.get_stale(cache_key)
+        if stale is None:
+            raise
+        logger.warning("Spoonacular unavailable, serving stale search results")
+        return stale
+
+    return store_search_page(cache_key, data)
+
+def store_search_page(cache_key: str, data: Dict) -> Dict:
+    # Cache only the fields we read; full complexSearch rows are several times larger
+    data = dict(data, results=[slim(recipe) for recipe in data.get('results', [])])
+    for recipe in data['results']:
+        if recipe.get('summary'):
+            summary_cache.set(str(recipe['id']), recipe['summary'])
+        recipe_index.add(recipe)
+    search_cache.set(cache_key, data)
+    return data
+
+@stage('filter')
+def filter_avoided(recipes: List[Dict], avoid: List[str]) -> List[Dict]:
+    # Filter out recipes whose title or ingredient list mentions an avoided ingredient
+    return compile_avoid_matcher(avoid).filter(recipes)
+
+def iter_search_pages(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str,
+                      offset: int = 0, page_size: int = 10, refresh: bool = False, count: Optional[int] = None):
+    # Yields (filtered recipes, next offset, total results) for successive complexSearch pages until count recipes
+    # survive the avoid filter. next_offset is just past the last recipe yielded, so resuming there skips none
+    ingredients = normalize_terms(ingredients)
+    avoid = normalize_terms(avoid)
+    diet = normalize_terms(diet)
+    intolerances = normalize_terms(intolerances)
+    page_size = min(max(page_size, 1), 100)  # complexSearch returns at most 100 per call
+
+    def fetch(page_offset):
+        return fetch_search_page(ingredients, avoid, diet, intolerances, api_key, page_offset, page_size, refresh)
+
+    remaining = count
+    data = fetch(offset)
+    while True:
+        results = data.get('results', [])
+        total = data.get('totalResults', 0)
+        recipes = filter_avoided(results, avoid)
+        next_offset = offset + len(results)
+
+        if remaining is not None and len(recipes) >= remaining:
+            if len(recipes) > remaining:
+                recipes = recipes[:remaining]
+                next_offset = offset + next(i for i, recipe in enumerate(results) if recipe is recipes[-1]) + 1
+            yield recipes, next_offset, total
+            return
+        if remaining is not None:
+            remaining -= len(recipes)
+
+        # This page falls short, so start on the next one while the caller works through it
+        upcoming = None
+        if results and next_offset < total:
+            upcoming = fetch_pool.submit(propagate(fetch), next_offset)
+
+        try:
+            yield recipes, next_offset, total
+        except GeneratorExit:
+            if upcoming is not None:
+                upcoming.cancel()
+            raise
+
+        if upcoming is None:
+            return
+        data = upcoming.result()
+        offset = next_offset
+
+def iter_search_results(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str,
+                        count: int = 10, offset: int = 0, refresh: bool = False):
+    # Keep paging until enough recipes survive the avoid filter
+    for recipes, _, _ in iter_search_pages(ingredients, avoid, diet, intolerances, api_key, offset, count, refresh,
+                                           count=count):
+        yield from recipes
+
+@stage('search')
+def search_recipes(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str,
+                   number: int = 10) -> List[Dict]:
+    # Identical queries in any order or case share one cache entry
+    cache_key = canonical_query(ingredients, avoid, diet, intolerances, number=number)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    offline = upstream_health.offline_reason()
+    if offline:
+        return offline_search(ingredients, avoid, diet, intolerances, number, offline)
+
+    # Answer from the local index when it already knows enough matching recipes
+    if config['LOCAL_SEARCH']:
+        # Only as many rows as the page needs, with headroom for what the avoid filter drops
+        local_results = filter_avoided(recipe_index.search(ingredients, avoid, diet, intolerances,
+                                                           limit=number * 2), avoid)
+        if len(local_results) >= number:
+            return local_results[:number]
+
+    try:
+        filtered_results = list(iter_search_results(ingredients, avoid, diet, intolerances, api_key, number))
+    except (UpstreamUnavailable, RateLimited, requests.RequestException):
+        # An expired copy of this exact search beats the closest local matches
+        stale = search_cache.get_stale(cache_key)
+        if stale is None:
+            logger.warning("Spoonacular unavailable, serving the closest local matches")
+            return offline_search(ingredients, avoid, diet, intolerances, number, 'Spoonacular is unavailable')
+        logger.warning("Spoonacular unavailable, serving stale search results")
+        return StaleResults(stale, 'Spoonacular is unavailable')
+
+    search_cache.set(cache_key, filtered_results)
     return filtered_results
 
+@stage('refresh_search')
+def refresh_search(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], api_key: str,
+                   number: int = 10) -> List[Dict]:
+    # For re-running saved searches: straight from Spoonacular, since the cache and the local index would only
+    # hand back what we already have. Failures raise instead of being answered locally, so nothing is saved over
+    offline = upstream_health.offline_reason()
+    if offline:
+        raise UpstreamUnavailable(offline)
+    results = list(iter_search_results(ingredients, avoid, diet, intolerances, api_key, number, refresh=True))
+    search_cache.set(canonical_query(ingredients, avoid, diet, intolerances, number=number), results)
+    return results
+
+@stage('offline_search')
+def offline_search(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str], number: int,
+                   reason: str) -> StaleResults:
+    # Recipes we already hold, those sharing the most requested ingredients first; never cached
+    ranked = recipe_index.rank(ingredients, avoid, diet, intolerances, limit=number * 2)
+    return StaleResults(filter_avoided(ranked, avoid)[:number], reason)
+
+@stage('details')
 def get_recipe_details(recipe_id: int, api_key: str) -> Dict:
-    url = f"https://api.spoonacular.com/recipes/{recipe_id}/information"
     params = {'apiKey': api_key}
-    res = requests.get(url, params=params)
-    res.raise_for_status()
-    return res.json()
+    return slim(upstream().get(f"recipes/{recipe_id}/information", params=params))
 
+@stage('summary')
 def get_recipe_summary(recipe_id: int, api_key: str) -> str:
-    url = f"https://api.spoonacular.com/recipes/{recipe_id}/summary"
     params = {'apiKey': api_key}
-    res = requests.get(url, params=params)
-    res.raise_for_status()
-    return res.json()['summary']
+    return upstream().get(f"recipes/{recipe_id}/summary", params=params)['summary']
+
+@stage('details_bulk')
+def get_recipe_details_bulk(recipe_ids: List[int], api_key: str) -> List[Dict]:
+    params = {'apiKey': api_key, 'ids': ','.join(str(recipe_id) for recipe_id in recipe_ids)}
+    # informationBulk costs one point for the first recipe and half a point for each additional one
+    recipes = upstream().get('recipes/informationBulk', params=params, cost=1 + 0.5 * (len(recipe_ids) - 1))
+    return [slim(details) for details in recipes]
+
+def fetch_recipes_bulk(recipe_ids: Iterable[int], api_key: str, chunk_size: Optional[int] = None,
+                       parallelism: Optional[int] = None) -> Dict[int, Dict]:
+    # Fetch every recipe not already stored, one informationBulk call per chunk
+    chunk_size = chunk_size or config['BULK_CHUNK_SIZE']
+    parallelism = parallelism or config['BULK_PARALLELISM']
+    missing = recipe_store.missing(recipe_ids)
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+
+    fetched = {}
+    # A pool of our own keeps chunk parallelism bounded and cannot starve fetch_pool
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='bulk') as pool:
+        for chunk, future in [(chunk, pool.submit(get_recipe_details_bulk, chunk, api_key)) for chunk in chunks]:
+            try:
+                recipes = future.result()
+            except Exception as e:
+                logger.warning(f"Bulk fetch of {len(chunk)} recipes failed: {e}")
+                continue
+            for details in recipes:
+                recipe_id = int(details['id'])
+                summary = details.get('summary') or summary_cache.get(str(recipe_id))
+                fetched[recipe_id] = {'details': details, 'summary': summary,
+                                      'fetched_at': store_recipe(recipe_id, details, summary)}
+    return fetched
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def fetch_recipe(recipe_id: int, api_key: str) -> Dict:
+    start = time.perf_counter()
+
+    timings = {}
+    with prefetcher.foreground():
+        details, timings['details'] = timed(get_recipe_details, recipe_id, api_key)
+        # /information already carries the summary; /summary is only asked for when it came back empty
+        summary = details.get('summary') or summary_cache.get(str(recipe_id))
+        if not summary:
+            summary, timings['summary'] = timed(get_recipe_summary, recipe_id, api_key)
+
+    timings['wall'] = time.perf_counter() - start
+    logger.info(f"Fetched recipe {recipe_id}: " +
+                ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items()))
+
+    fetched_at = store_recipe(recipe_id, details, summary)
+    return {'details': details, 'summary': summary, 'fetched_at': fetched_at, 'timings': timings}
+
+def store_recipe(recipe_id: int, details: Dict, summary: str) -> float:
+    fetched_at = recipe_store.put(recipe_id, details, summary)
+    recipe_index.add(dict(details, summary=summary))
+    return fetched_at
+
+def refresh_recipe_in_background(recipe_id: int, api_key: str):
+    with _refreshing_lock:
+        if recipe_id in _refreshing:
+            return
+        _refreshing.add(recipe_id)
+
+    def refresh():
+        try:
+            fetch_recipe(recipe_id, api_key)
+        except Exception as e:
+            logger.warning(f"Background refresh of recipe {recipe_id} failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(recipe_id)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+def load_recipe(recipe_id: int, api_key: str) -> Dict:
+    # Serve from the local store; stale entries are returned immediately and refreshed behind the scenes
+    stored = recipe_store.get(recipe_id)
+    prefetcher.record_access(recipe_id, cached=stored is not None)
+    offline = upstream_health.offline_reason()
+    if stored is None:
+        if offline:
+            raise UpstreamUnavailable(offline)
+        return fetch_recipe(recipe_id, api_key)
+    if offline:
+        return dict(stored, offline=offline)
+    if stored['stale']:
+        refresh_recipe_in_background(recipe_id, api_key)
+    return stored
+
+def prefetch_results(recipes: List[Dict]):
+    if isinstance(recipes, StaleResults):
+        return
+    prefetcher.submit([recipe['id'] for recipe in recipes[:config['PREFETCH_TOP_K']] if recipe.get('id')])
 
 def load_saved_searches():
-    saved_searches_path = Path(__file__).parent / 'saved_searches.json'
-    if saved_searches_path.exists():
-        with open(saved_searches_path, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_searches(searches):
-    saved_searches_path = Path(__file__).parent / 'saved_searches.json'
-    with open(saved_searches_path, 'w') as f:
-        json.dump(searches, f)
-
-# Load API key
-env_path = Path(__file__).parent / 'recipehunter.env'
-API_KEY = load_api_key(env_path)
-#app.secret_key = load_api_key(env_path)
+    return saved_search_store.all()
+
+def batch_query(spec: Dict, saved: Optional[str] = None) -> Dict:
+    query = {}
+    for field in ('ingredients', 'avoid', 'diet', 'intolerances'):
+        terms = spec.get(field) or []
+        # A bare string would otherwise be taken one character at a time
+        if not isinstance(terms, list):
+            raise ValueError(f"{field} must be a list")
+        query[field] = [str(term) for term in terms]
+    query['number'] = min(max(int(spec.get('number', 10)), 1), 100)
+    if saved is not None:
+        query['saved'] = saved
+    return query
+
+def saved_search_queries(names: Optional[Iterable[str]] = None) -> List[Dict]:
+    # Every saved search, or just the named ones, as batch queries that write their results back
+    searches = load_saved_searches()
+    names = list(searches) if names is None else names
+    return [batch_query(searches[name], saved=name) for name in names if name in searches]
+
+def saved_recipe_entries(recipes: List[Dict]) -> List[Dict]:
+    # Saved searches keep the same id/title/summary entries the page saves
+    return [{'id': recipe['id'], 'title': recipe.get('title', ''), 'summary': recipe.get('summary', '')}
+            for recipe in recipes]
+
+def run_batch(queries: List[Dict], api_key: str, parallelism: Optional[int] = None) -> Iterator[Dict]:
+    # Identical queries run once; one result per distinct query is yielded as soon as it completes.
+    # Upstream calls go through the shared client, so the batch draws on the same rate budget as everything else
+    groups: Dict[str, List[int]] = {}
+    for position, query in enumerate(queries):
+        key = canonical_query(query['ingredients'], query['avoid'], query['diet'], query['intolerances'],
+                              number=query['number'])
+        groups.setdefault(key, []).append(position)
+
+    pool = ThreadPoolExecutor(max_workers=parallelism or config['BATCH_PARALLELISM'], thread_name_prefix='batch')
+    try:
+        futures = {}
+        for positions in groups.values():
+            query = queries[positions[0]]
+            # Saved searches are being refreshed, so they skip the cache and the local index
+            search = refresh_search if any('saved' in queries[position] for position in positions) else search_recipes
+            future = pool.submit(propagate(search), query['ingredients'], query['avoid'], query['diet'],
+                                 query['intolerances'], api_key, query['number'])
+            futures[future] = positions
+
+        for future in as_completed(futures):
+            positions = futures[future]
+            names = [queries[position]['saved'] for position in positions if 'saved' in queries[position]]
+            line = {'queries': positions, 'names': names}
+            try:
+                recipes = future.result()
+            except Exception as e:
+                yield dict(line, error=f"An error occurred: {str(e)}")
+                continue
+            if isinstance(recipes, StaleResults):
+                # Local stand-ins are reported but not saved over what Spoonacular last returned
+                yield dict(line, recipes=recipes, stale=recipes.reason)
+                continue
+            saved = saved_recipe_entries(recipes)
+            for name in names:
+                saved_search_store.refresh_recipes(name, saved)
+            yield dict(line, recipes=recipes)
+    finally:
+        # A client that hangs up mid-stream should not leave queries running on its behalf
+        pool.shutdown(wait=False, cancel_futures=True)
 
 # Predefined lists
 POPULAR_INGREDIENTS = [
@@ -94,335 +665,249 @@ INTOLERANCE_OPTIONS = [
     "Soy", "Sulfite", "Tree Nut", "Wheat"
 ]
 
-# HTML template
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Recipe Hunter</title>
-    <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/select2@4.1.0-rc.0/dist/js/select2.min.js"></script>
-    <link href="https://cdn.jsdelivr.net/npm/select2@4.1.0-rc.0/dist/css/select2.min.css" rel="stylesheet" />
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            line-height: 1.6;
-            margin: 0;
-            padding: 20px;
-            transition: background-color 0.3s, color 0.3s;
-            background-color: #333;
-            color: #f4f4f4;
-        }
-        body.light-mode {
-            background-color: #f4f4f4;
-            color: #333;
-        }
-        .container {
-            max-width: 1200px;
-            margin: auto;
-            display: flex;
-        }
-        .search-section {
-            flex: 1;
-            padding-right: 20px;
-        }
-        .results-section {
-            flex: 1;
-            padding-left: 20px;
-        }
-        h1, h2 {
-            color: #f4f4f4;
-        }
-        .light-mode h1, .light-mode h2 {
-            color: #333;
-        }
-        select, input[type="submit"] {
-            margin-bottom: 10px;
-        }
-        ul {
-            list-style-type: none;
-            padding: 0;
-        }
-        li {
-            margin-bottom: 15px;
-            background-color: rgba(255, 255, 255, 0.1);
-            padding: 10px;
-            border-radius: 5px;
-        }
-        .light-mode li {
-            background-color: rgba(0, 0, 0, 0.05);
-        }
-        .error {
-            color: #ff6b6b;
-            font-weight: bold;
-        }
-        .mode-toggle {
-            position: fixed;
-            top: 10px;
-            right: 10px;
-        }
-        .select2-container--default .select2-selection--multiple,
-        .select2-container--default .select2-selection--single {
-            background-color: #444;
-            border: 1px solid #fff;
-            color: #f4f4f4;
-        }
-        .select2-container--default .select2-selection--multiple .select2-selection__choice {
-            background-color: #555;
-            color: #f4f4f4;
-            border: 1px solid #777;
-        }
-        .select2-container--default .select2-results__option {
-            background-color: #444;
-            color: #f4f4f4;
-        }
-        .select2-container--default .select2-results__option--highlighted[aria-selected] {
-            background-color: #555;
-        }
-        .light-mode .select2-container--default .select2-selection--multiple,
-        .light-mode .select2-container--default .select2-selection--single {
-            background-color: #fff;
-            border: 1px solid #aaa;
-            color: #333;
-        }
-        .light-mode .select2-container--default .select2-selection--multiple .select2-selection__choice {
-            background-color: #e4e4e4;
-            color: #333;
-            border: 1px solid #aaa;
-        }
-        .light-mode .select2-container--default .select2-results__option {
-            background-color: #fff;
-            color: #333;
-        }
-        .light-mode .select2-container--default .select2-results__option--highlighted[aria-selected] {
-            background-color: #ddd;
-        }
-        .recipe-summary {
-            font-style: italic;
-            margin-top: 5px;
-        }
-        #search-name {
-            width: 100%;
-            padding: 5px;
-            margin-bottom: 10px;
-        }
-        #save-search {
-            margin-top: 10px;
-        }
-        #saved-searches-list {
-            display: none;
-            margin-top: 10px;
-        }
-        #saved-searches-list select {
-            width: 100%;
-            margin-bottom: 10px;
-        }
-    </style>
-   <script>
-        $(document).ready(function() {
-            $('.select2-multi').select2({
-                tags: true,
-                tokenSeparators: [',', ' '],
-                placeholder: "Select or type ingredients"
-            });
-            $('.select2-dropdown').select2({
-                placeholder: "Select options"
-            });
-            
-            // Mode toggle
-            function setMode(mode) {
-                if (mode === 'light') {
-                    $('body').addClass('light-mode');
-                    localStorage.setItem('mode', 'light');
-                    $('#mode-toggle').prop('checked', false);
-                } else {
-                    $('body').removeClass('light-mode');
-                    localStorage.setItem('mode', 'dark');
-                    $('#mode-toggle').prop('checked', true);
-                }
-            }
-
-            // Check localStorage for saved mode
-            var savedMode = localStorage.getItem('mode') || 'dark';
-            setMode(savedMode);
-
-            // Mode toggle event listener
-            $('#mode-toggle').change(function() {
-                setMode(this.checked ? 'dark' : 'light');
-            });
-
-            // Clear All button
-            $('#clear-all').click(function() {
-                $('.select2-multi, .select2-dropdown').val(null).trigger('change');
-                $('#search-name').val('');
-                // Clear results section
-                $('.results-section').html('');
-                // Clear session data
-                $.post('/clear_session');
-                // Hide saved searches list if it's visible
-                $('#saved-searches-list').hide();
-            });
-
-             // Save Search button
-            $('#save-search').click(function() {
-                var searchData = {
-                    name: $('#search-name').val() || 'Unnamed Search',
-                    ingredients: $('#ingredients').val(),
-                    avoid: $('#avoid').val(),
-                    diet: $('#diet').val(),
-                    intolerances: $('#intolerances').val(),
-                    recipes: []  // This will be populated with recipe data
-                };
-
-                // Collect recipe data
-                $('.recipe-item').each(function() {
-                    searchData.recipes.push({
-                        title: $(this).find('.recipe-title').text(),
-                        summary: $(this).find('.recipe-summary').text(),
-                        id: $(this).data('recipe-id')
-                    });
-                });
-
-                $.ajax({
-                    url: '/save_search',
-                    type: 'POST',
-                    contentType: 'application/json',
-                    data: JSON.stringify(searchData),
-                    success: function(response) {
-                        alert('Search saved successfully!');
-                    },
-                    error: function(error) {
-                        alert('Error saving search: ' + error.responseText);
-                    }
-                });
-            });
-            // Load Saved Searches button
-            $('#load-saved-searches').click(function() {
-                $.get('/get_saved_searches', function(data) {
-                    var selectHtml = '<select id="saved-search-select">';
-                    for (var key in data) {
-                        selectHtml += '<option value="' + key + '">' + key + '</option>';
-                    }
-                    selectHtml += '</select>';
-                    $('#saved-searches-list').html(selectHtml + '<button id="load-selected-search">Load Selected Search</button>');
-                    $('#saved-searches-list').show();
-                });
-            });
-
-            // Load Selected Search button
-            $(document).on('click', '#load-selected-search', function() {
-                var selectedSearch = $('#saved-search-select').val();
-                $.get('/load_saved_search/' + encodeURIComponent(selectedSearch), function(data) {
-                    $('#search-name').val(selectedSearch);
-                    $('#ingredients').val(data.ingredients).trigger('change');
-                    $('#avoid').val(data.avoid).trigger('change');
-                    $('#diet').val(data.diet).trigger('change');
-                    $('#intolerances').val(data.intolerances).trigger('change');
-                    alert('Search loaded successfully!');
-                });
-            });
-        });
-    </script>
-</head>
-<body>
-    <div class="container">
-        <div class="search-section">
-            <h1>Recipe Hunter</h1>
-            <form method="post">
-                <label for="search-name">Search Name:</label><br>
-                <input type="text" id="search-name" name="search_name" value="{{ session.get('search_name', '') }}" placeholder="Enter a name for your search"><br>
-                <label for="ingredients">Ingredients:</label><br>
-                <select class="select2-multi" id="ingredients" name="ingredients" multiple="multiple" style="width: 100%;">
-                    {% for ingredient in popular_ingredients %}
-                        <option value="{{ ingredient }}" {% if ingredient in session.get('ingredients', []) %}selected{% endif %}>{{ ingredient }}</option>
-                    {% endfor %}
-                </select><br>
-                <label for="avoid">Ingredients to avoid:</label><br>
-                <select class="select2-multi" id="avoid" name="avoid" multiple="multiple" style="width: 100%;">
-                    {% for ingredient in popular_ingredients %}
-                        <option value="{{ ingredient }}" {% if ingredient in session.get('avoid', []) %}selected{% endif %}>{{ ingredient }}</option>
-                    {% endfor %}
-                </select><br>
-                <label for="diet">Diet:</label><br>
-                <select class="select2-dropdown" id="diet" name="diet" multiple="multiple" style="width: 100%;">
-                    {% for diet in diet_options %}
-                        <option value="{{ diet }}" {% if diet in session.get('diet', []) %}selected{% endif %}>{{ diet }}</option>
-                    {% endfor %}
-                </select><br>
-                <label for="intolerances">Intolerances:</label><br>
-                <select class="select2-dropdown" id="intolerances" name="intolerances" multiple="multiple" style="width: 100%;">
-                    {% for intolerance in intolerance_options %}
-                        <option value="{{ intolerance }}" {% if intolerance in session.get('intolerances', []) %}selected{% endif %}>{{ intolerance }}</option>
-                    {% endfor %}
-                </select><br>
-                <input type="submit" value="Search Recipes">
-                <button type="button" id="clear-all">Clear All</button>
-                <button type="button" id="save-search">Save Search</button>
-                <button type="button" id="load-saved-searches">Load Saved Searches</button>
-            </form>
-            <div id="saved-searches-list"></div>
-        </div>
-        <div class="results-section">
-            {% if recipes is not none %}
-                {% if recipes %}
-                    <h2>Recipes:</h2>
-                    <ul>
-                    {% for recipe in recipes %}
-                        <li class="recipe-item" data-recipe-id="{{ recipe.id }}">
-                            <a href="{{ url_for('recipe_details', recipe_id=recipe.id) }}" class="recipe-title">{{ recipe.title }}</a>
-                            <p class="recipe-summary">{{ recipe.summary[:120] }}...</p>
-                        </li>
-                    {% endfor %}
-                    </ul>
-                {% else %}
-                    <p>No recipes found. Try adjusting your search criteria.</p>
-                {% endif %}
-            {% endif %}
-            {% if error %}
-                <p class="error">{{ error }}</p>
-            {% endif %}
-        </div>
-    </div>
-    <div class="mode-toggle">
-        <label for="mode-toggle">Dark Mode</label>
-        <input type="checkbox" id="mode-toggle">
-    </div>
-</body>
-</html>
-'''
-
-@app.route('/save_search', methods=['POST'])
+@lru_cache(maxsize=None)
+def asset_hash(filename: str) -> str:
+    with open(Path(current_app.static_folder) / filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+@bp.app_template_global()
+def asset_url(filename: str) -> str:
+    return f"{current_app.static_url_path}/{filename}?v={asset_hash(filename)}"
+
+@lru_cache(maxsize=None)
+def template_hash(name: str) -> str:
+    with open(Path(current_app.root_path) / current_app.template_folder / name, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def recipe_page_version() -> str:
+    # Besides the recipe, the page changes with its template and the versioned asset URLs it embeds
+    return '-'.join((template_hash('recipe.html'), asset_hash('css/recipe.css'), asset_hash('js/recipe.js')))
+
+def collect_metrics():
+    for name, cache in (('search', search_cache), ('summary', summary_cache), ('compressed', compressed_variants)):
+        stats = cache.stats()
+        for field in ('entries', 'hits', 'misses', 'stale_hits', 'hit_ratio'):
+            yield f"recipehunter_cache_{field}", {'cache': name}, stats[field]
+    upstream = spoonacular.stats()
+    for field in ('calls', 'retries', 'quota_used', 'quota_left'):
+        yield f"recipehunter_upstream_{field}", {}, upstream[field]
+    yield 'recipehunter_upstream_coalesced', {}, upstream['single_flight']['coalesced']
+    yield 'recipehunter_upstream_circuit_open', {}, upstream['circuit'] != 'closed'
+    for field in ('remaining', 'throttled', 'rejected'):
+        yield f"recipehunter_rate_limit_{field}", {}, upstream['rate_limit'][field]
+    for field, value in prefetcher.stats().items():
+        yield f"recipehunter_prefetch_{field}", {}, value
+    yield 'recipehunter_index_recipes', {}, len(recipe_index)
+
+REGISTRY.add_collector(collect_metrics)
+
+@bp.before_app_request
+def start_trace():
+    g.trace = Trace()
+    current_trace.set(g.trace)
+    if config['PROFILE_SLOW_MS']:
+        profiler.start()
+
+@bp.before_app_request
+def start_background_refresh():
+    # Started by the first request rather than at import, so each gunicorn worker runs its own after the fork
+    if config['SAVED_SEARCH_REFRESH_PERIOD']:
+        saved_search_refresher.start()
+
+def start_render(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+def finish_render(sender, template, context, **extra):
+    record_stage('render', time.perf_counter() - g.pop('render_started', time.perf_counter()))
+
+# Registered before http_caching so that it runs after it and times compression too
+@bp.after_app_request
+def finish_trace(response):
+    trace = g.get('trace')
+    if trace is None:
+        return response
+    seconds = trace.elapsed()
+    endpoint = request.endpoint or 'unmatched'
+    observe_request(endpoint, response.status_code, seconds)
+    response.headers['Server-Timing'] = trace.server_timing()
+
+    if config['PROFILE_SLOW_MS']:
+        samples = profiler.stop()
+        if samples and seconds * 1000 >= config['PROFILE_SLOW_MS']:
+            path = Path(config['PROFILE_DIR']) / f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{seconds * 1000:.0f}ms.folded"
+            profiler.dump(samples, path)
+            logger.warning(f"Slow request {request.path} ({seconds * 1000:.0f}ms), profile written to {path}")
+    return response
+
+@bp.after_app_request
+def http_caching(response):
+    return apply_http_caching(request, response, CACHE_POLICIES, compressed_variants,
+                              config['COMPRESS_MIN_SIZE'])
+
+@bp.after_app_request
+def mark_stale(response):
+    # Runs before http_caching (after-request hooks run last-registered first), so shared caches
+    # do not keep local stand-ins once Spoonacular is back
+    stale = g.get('stale')
+    if stale:
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-Served-From'] = 'local'
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/save_search', methods=['POST'])
 def save_search():
     search_data = request.json
     search_name = search_data.get('name') or f"New Search {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
     
-    saved_searches = load_saved_searches()
-    saved_searches[search_name] = {
+    saved_search_store.upsert(search_name, {
         'ingredients': search_data.get('ingredients', []),
         'avoid': search_data.get('avoid', []),
         'diet': search_data.get('diet', []),
         'intolerances': search_data.get('intolerances', []),
         'recipes': search_data.get('recipes', [])
-    }
-    save_searches(saved_searches)
+    })
     
     return jsonify({'message': 'Search saved successfully'}), 200
 
-@app.route('/get_saved_searches', methods=['GET'])
+@bp.route('/get_saved_searches', methods=['GET'])
 def get_saved_searches():
-    return jsonify(load_saved_searches())
+    prefix = request.args.get('prefix', '')
+    sort = request.args.get('sort', 'name')
+    descending = request.args.get('order', 'asc') == 'desc'
+    cursor = request.args.get('cursor') or None
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    # The listing only changes when a search is written, so the store revision identifies it
+    etag = hashlib.sha1(
+        json.dumps([saved_search_store.revision(), prefix, sort, descending, cursor, limit]).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
 
-@app.route('/load_saved_search/<search_name>')
+    try:
+        searches, next_cursor = saved_search_store.list(prefix, sort, descending, limit, cursor)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid sort or cursor'}), 400
+    response = jsonify({'searches': searches, 'next_cursor': next_cursor})
+    response.set_etag(etag)
+    return response
+
+@bp.route('/load_saved_search/<search_name>')
 def load_saved_search(search_name):
-    saved_searches = load_saved_searches()
-    if search_name in saved_searches:
-        return jsonify(saved_searches[search_name])
-    else:
+    # A purely local read: the recipes were brought up to date by the background refresh
+    saved_search = saved_search_store.get(search_name)
+    if saved_search is None:
         return jsonify({'error': 'Search not found'}), 404
+    seen = saved_search_store.mark_viewed(search_name)
+    added = set(seen['added'])
+    return jsonify(dict(saved_search, refreshed_at=seen['refreshed_at'], last_viewed_at=seen['last_viewed_at'],
+                        new_since_last_view=[recipe for recipe in saved_search.get('recipes', [])
+                                             if recipe.get('id') in added]))
+
+@bp.route('/search/stream', methods=['GET'])
+def search_stream():
+    # Offline answers ignore offset: the closest local matches are not a pageable result set
+    ingredients = request.args.getlist('ingredients')
+    avoid = request.args.getlist('avoid')
+    diet = request.args.getlist('diet')
+    intolerances = request.args.getlist('intolerances')
+    try:
+        count = min(max(int(request.args.get('count', 30)), 1), 500)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'count and offset must be integers'}), 400
+
+    offline = upstream_health.offline_reason()
+    if offline:
+        g.stale = offline
+
+    # One JSON object per line, flushed page by page; the last line says where to resume
+    def generate():
+        if offline:
+            for recipe in offline_search(ingredients, avoid, diet, intolerances, count, offline):
+                yield json.dumps({'recipe': recipe}) + '\n'
+            yield json.dumps({'next_offset': offset, 'done': True, 'stale': offline}) + '\n'
+            return
+        sent = 0
+        next_offset = offset
+        total = 0
+        try:
+            for recipes, next_offset, total in iter_search_pages(ingredients, avoid, diet, intolerances,
+                                                                 config['API_KEY'], offset, min(count, 100),
+                                                                 count=count):
+                for recipe in recipes:
+                    yield json.dumps({'recipe': recipe}) + '\n'
+                sent += len(recipes)
+        except Exception as e:
+            yield json.dumps({'error': f"An error occurred: {str(e)}"}) + '\n'
+            return
+        # Falling short of count means the pages ran out
+        yield json.dumps({'next_offset': next_offset, 'done': sent < count or next_offset >= total}) + '\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/suggest', methods=['GET'])
+def suggest():
+    # Typeahead for the ingredient pickers, in the shape select2 expects
+    term = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    names = recipe_index.suggestions.suggest(term, limit) if term.strip() else POPULAR_INGREDIENTS[:limit]
+    return jsonify({'results': [{'id': name, 'text': name} for name in names]})
+
+@bp.route('/search/batch', methods=['POST'])
+def search_batch():
+    # {"queries": [{"ingredients": [...], "avoid": [...], ...}], "saved": true | ["name", ...]}
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        body = {}
+    specs, saved = body.get('queries') or [], body.get('saved')
+    if not isinstance(specs, list):
+        return jsonify({'error': 'queries must be a list'}), 400
+    if not (saved is None or isinstance(saved, bool)
+            or isinstance(saved, list) and all(isinstance(name, str) for name in saved)):
+        return jsonify({'error': 'saved must be true or a list of names'}), 400
+    try:
+        queries = [batch_query(spec) for spec in specs]
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid query: {e}"}), 400
+    if saved:
+        queries += saved_search_queries(None if saved is True else saved)
+    if not queries:
+        return jsonify({'error': 'No queries'}), 400
+    # Counted once the saved searches are in, so saved: true cannot get around the limit
+    if len(queries) > config['BATCH_MAX_QUERIES']:
+        return jsonify({'error': f"At most {config['BATCH_MAX_QUERIES']} queries per batch"}), 400
+
+    # One JSON object per distinct query, in completion order; the last line totals the batch
+    def generate():
+        distinct = failed = 0
+        for line in run_batch(queries, config['API_KEY']):
+            distinct += 1
+            failed += 'error' in line
+            yield json.dumps(line) + '\n'
+        yield json.dumps({'done': True, 'queries': len(queries), 'distinct': distinct, 'failed': failed}) + '\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'search': search_cache.stats(), 'upstream': spoonacular.stats(), 'index': recipe_index.stats(),
+                    'prefetch': prefetcher.stats(), 'refresh': saved_search_refresher.stats(),
+                    'offline': upstream_health.stats()})
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    return current_app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/clear_session', methods=['POST'])
+@bp.route('/clear_session', methods=['POST'])
 def clear_session():
     # Clear everything from the session except saved searches
     for key in list(session.keys()):
@@ -430,15 +915,13 @@ def clear_session():
             session.pop(key)
     return '', 204
 
-@app.route('/', methods=['GET', 'POST'])
+@bp.route('/', methods=['GET', 'POST'])
 def home():
     if request.method == 'POST':
         search_name = request.form.get('search_name') or f"New Search {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         if not search_name:
             search_name = f"new search {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         
-        app.secret_key = search_name  # Set the secret key dynamically
-        
         ingredients = request.form.getlist('ingredients')
         avoid = request.form.getlist('avoid')
         diet = request.form.getlist('diet')
@@ -452,185 +935,159 @@ def home():
         session['intolerances'] = intolerances
         
         try:
-            recipes = search_recipes(ingredients, avoid, diet, intolerances, API_KEY)
-            return render_template_string(HTML_TEMPLATE, 
+            recipes = search_recipes(ingredients, avoid, diet, intolerances, config['API_KEY'])
+            prefetch_results(recipes)
+            stale = g.stale = getattr(recipes, 'reason', None)
+            return render_template('index.html', 
                                           recipes=recipes, 
-                                          popular_ingredients=POPULAR_INGREDIENTS,
+                                          stale=stale,
                                           diet_options=DIET_OPTIONS,
                                           intolerance_options=INTOLERANCE_OPTIONS)
         except Exception as e:
-            return render_template_string(HTML_TEMPLATE, 
+            return render_template('index.html', 
                                           error=f"An error occurred: {str(e)}", 
                                           recipes=None,
-                                          popular_ingredients=POPULAR_INGREDIENTS,
                                           diet_options=DIET_OPTIONS,
                                           intolerance_options=INTOLERANCE_OPTIONS)
 
-    # Set a default secret key for GET requests
-    app.secret_key = f"new search {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-
-    return render_template_string(HTML_TEMPLATE, 
+    return render_template('index.html', 
                                   recipes=None,
-                                  popular_ingredients=POPULAR_INGREDIENTS,
                                   diet_options=DIET_OPTIONS,
                                   intolerance_options=INTOLERANCE_OPTIONS)
 
 
-@app.route('/recipe/<int:recipe_id>')
+@stage('render')
+def render_recipe_page(details: Dict, summary: str, stale: Optional[str] = None) -> str:
+    # Rendered straight from the environment so the ASGI path can use it outside a request
+    return current_app.jinja_env.get_template('recipe.html').render(details=details, summary=summary, stale=stale)
+
+def render_unavailable_recipe(recipe_id: int, reason: str) -> Tuple[str, int]:
+    # Neither stored nor fetchable: show what the search index knows about the recipe, if anything
+    listing = recipe_index.get(recipe_id)
+    if listing is not None:
+        return render_recipe_page(listing, listing.get('summary', ''), stale=reason), 200
+    return render_recipe_page({'title': 'Recipe unavailable'}, '', stale=reason), 503
+
+@bp.route('/recipe/<int:recipe_id>')
 def recipe_details(recipe_id):
     try:
-        details = get_recipe_details(recipe_id, API_KEY)
-        summary = get_recipe_summary(recipe_id, API_KEY)
-        
-        ingredients_list = ''.join(f'<li>{item["original"]}</li>' for item in details['extendedIngredients'])
-        
-        recipe_html = f'''
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>{details['title']} - Recipe Details</title>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    margin: 0;
-                    padding: 20px;
-                    max-width: 800px;
-                    margin: auto;
-                    background-color: #333;
-                    color: #f4f4f4;
-                    transition: background-color 0.3s, color 0.3s;
-                }}
-                body.light-mode {{
-                    background-color: #f4f4f4;
-                    color: #333;
-                }}
-                h1, h2 {{
-                    color: #f4f4f4;
-                }}
-                body.light-mode h1, body.light-mode h2 {{
-                    color: #333;
-                }}
-                ul {{
-                    padding-left: 20px;
-                }}
-                a {{
-                    color: #4fc3f7;
-                }}
-                body.light-mode a {{
-                    color: #1976d2;
-                }}
-                .top-bar {{
-                    position: fixed;
-                    top: 0;
-                    left: 0;
-                    right: 0;
-                    background-color: #222;
-                    padding: 10px;
-                    display: flex;
-                    justify-content: flex-end;
-                    align-items: center;
-                }}
-                body.light-mode .top-bar {{
-                    background-color: #ddd;
-                }}
-                .back-button {{
-                    margin-right: 20px;
-                    padding: 5px 10px;
-                    background-color: #4fc3f7;
-                    color: #333;
-                    text-decoration: none;
-                    border-radius: 5px;
-                }}
-                body.light-mode .back-button {{
-                    background-color: #1976d2;
-                    color: #fff;
-                }}
-                .content {{
-                    margin-top: 60px;
-                }}
-            </style>
-            <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-            <script>
-                $(document).ready(function() {{
-                    function setMode(mode) {{
-                        if (mode === 'light') {{
-                            $('body').addClass('light-mode');
-                            localStorage.setItem('mode', 'light');
-                            $('#mode-toggle').prop('checked', false);
-                        }} else {{
-                            $('body').removeClass('light-mode');
-                            localStorage.setItem('mode', 'dark');
-                            $('#mode-toggle').prop('checked', true);
-                        }}
-                    }}
-
-                    var savedMode = localStorage.getItem('mode') || 'dark';
-                    setMode(savedMode);
-
-                    $('#mode-toggle').change(function() {{
-                        setMode(this.checked ? 'dark' : 'light');
-                    }});
-                }});
-            </script>
-        </head>
-        <body>
-            <div class="top-bar">
-                <a href="javascript:history.back()" class="back-button">Back to Search</a>
-                <div class="mode-toggle">
-                    <label for="mode-toggle">Dark Mode</label>
-                    <input type="checkbox" id="mode-toggle">
-                </div>
-            </div>
-            <div class="content">
-                <h1>{details['title']}</h1>
-                <h2>Ingredients:</h2>
-                <ul>
-                {ingredients_list}
-                </ul>
-                <h2>Summary:</h2>
-                <p>{summary}</p>
-                <h2>Instructions:</h2>
-                <p>{details['instructions']}</p>
-                <p><a href="{details['sourceUrl']}">Original Recipe</a></p>
-            </div>
-        </body>
-        </html>
-        '''
-        
-        return recipe_html
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
-
-# Load API key
-env_path = Path(__file__).parent / 'recipehunter.env'
-try:
-    app.config['API_KEY'] = load_api_key(env_path)
-except Exception as e:
-    print(f"Error loading API key: {e}")
-    exit(1)
-
-# Define constants
-POPULAR_INGREDIENTS = [
-    "Chicken", "Beef", "Pork", "Pasta", "Rice", "Potatoes", "Onions", "Garlic",
-    "Tomatoes", "Cheese", "Eggs", "Milk", "Bread", "Butter", "Olive Oil",
-    "Salt", "Pepper", "Sugar", "Flour", "Carrots", "Celery", "Bell Peppers",
-    "Broccoli", "Spinach", "Lettuce", "Corn", "Beans", "Mushrooms", "Lemon", "Lime"
-]
+        recipe = load_recipe(recipe_id, config['API_KEY'])
+    except (UpstreamUnavailable, RateLimited, requests.RequestException) as e:
+        # Only an outage is Spoonacular's fault; a recipe it says does not exist is a plain 404
+        status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+        if status == 404:
+            return render_recipe_page({'title': 'Recipe not found'}, ''), 404
+        if status is not None and status < 500 and status not in (402, 429):
+            raise
+        logger.warning(f"Recipe {recipe_id} unavailable: {e}")
+        g.stale = upstream_health.offline_reason() or 'Spoonacular is unavailable'
+        return render_unavailable_recipe(recipe_id, g.stale)
 
-DIET_OPTIONS = [
-    "Gluten Free", "Ketogenic", "Vegetarian", "Lacto-Vegetarian", "Ovo-Vegetarian",
-    "Pescetarian", "Paleo", "Primal", "Low FODMAP", "Whole30"
-]
+    # The page only changes when the stored recipe, the template or its assets do, so skip rendering on a match
+    stale = recipe.get('offline')
+    etag = f"recipe-{recipe_id}-{int(recipe['fetched_at'])}-{recipe_page_version()}" + ('-offline' if stale else '')
+    if stale:
+        g.stale = stale
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response = current_app.response_class(render_recipe_page(recipe['details'], recipe['summary'], stale),
+                                          mimetype='text/html')
+    response.set_etag(etag)
+    return response
 
-INTOLERANCE_OPTIONS = [
-    "Dairy", "Egg", "Gluten", "Grain", "Peanut", "Seafood", "Sesame", "Shellfish",
-    "Soy", "Sulfite", "Tree Nut", "Wheat"
-]
+@bp.cli.command('warm-recipes')
+def warm_recipes():
+    """Pre-fetch details for every recipe referenced by a saved search."""
+    recipe_ids = [recipe['id'] for search in load_saved_searches().values()
+                  for recipe in search.get('recipes', []) if recipe.get('id')]
+    missing = recipe_store.missing(recipe_ids)
+    print(f"{len(recipe_ids)} saved recipes, {len(missing)} not yet stored")
+    fetched = fetch_recipes_bulk(missing, config['API_KEY'])
+    print(f"Fetched {len(fetched)} recipes")
+    for recipe_id in set(missing) - set(fetched):
+        print(f"Failed to fetch recipe {recipe_id}")
+
+@bp.cli.command('search-batch')
+@click.option('--file', 'specs', type=click.File(), help='JSON list of queries to run ("-" for stdin)')
+@click.option('--saved', is_flag=True, help='Re-run every saved search and store its new recipes')
+@click.option('--name', 'names', multiple=True, help='Re-run this saved search (may be repeated)')
+@click.option('--parallelism', type=int, help='Queries to run at once')
+def search_batch_command(specs, saved, names, parallelism):
+    """Run many searches at once and print one NDJSON line per distinct query."""
+    queries = [batch_query(spec) for spec in json.load(specs)] if specs else []
+    if saved or names:
+        queries += saved_search_queries(None if saved else names)
+    if not queries:
+        raise click.UsageError('Give --file, --saved or --name')
+    for line in run_batch(queries, config['API_KEY'], parallelism):
+        click.echo(json.dumps(line))
+
+@bp.cli.command('refresh-saved-searches')
+@click.option('--limit', type=int, default=0, help='Refresh at most this many searches (0 for every one due)')
+def refresh_saved_searches(limit):
+    """Re-run the saved searches that are due, e.g. from cron instead of the in-process scheduler."""
+    refreshed = 0
+    while not limit or refreshed < limit:
+        delta = saved_search_refresher.run_once()
+        if delta is None:
+            break
+        refreshed += 1
+        print(f"{delta['name']}: {len(delta['added'])} new, {len(delta['removed'])} gone")
+    print(f"Refreshed {refreshed} saved searches")
+
+def warm_up(app: Flask) -> Dict[str, float]:
+    # Pays the first-request costs up front; safe to run in a gunicorn master before it forks
+    timings = {}
+    with app.app_context():
+        for name, step in (
+                ('saved_searches', lambda: len(saved_search_store)),
+                ('index', lambda: len(recipe_index)),
+                ('templates', lambda: [app.jinja_env.get_template(template)
+                                       for template in ('index.html', 'recipe.html')]),
+                ('assets', lambda: [asset_hash(filename) for filename in ('css/style.css', 'js/app.js',
+                                                                          'css/recipe.css', 'js/recipe.js')])):
+            start = time.perf_counter()
+            step()
+            timings[name] = time.perf_counter() - start
+    return timings
+
+def collect_startup():
+    for name, seconds in startup_timings.items():
+        yield 'recipehunter_startup_seconds', {'stage': name}, seconds
+
+def collect_offline():
+    yield 'recipehunter_offline', {}, 1 if upstream_health.offline_reason() else 0
+
+REGISTRY.describe('recipehunter_offline', 'gauge', '1 while searches and pages are served from local data only')
+REGISTRY.add_collector(collect_startup)
+REGISTRY.add_collector(collect_offline)
+
+def create_app(overrides: Optional[Dict[str, Any]] = None) -> Flask:
+    global config
+    start = time.perf_counter()
+    app = Flask(__name__)
+    # Templates are compiled once and their bytecode cached on disk across restarts
+    app.jinja_options = dict(Flask.jinja_options, bytecode_cache=FileSystemBytecodeCache())
+    # Static assets are addressed by content hash (see asset_url), so browsers may keep them for a year
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
+    app.config.update(overrides or {})
+    load_config(app)
+    config = app.config
+
+    app.session_interface = ServerSideSessionInterface(session_store)
+    app.register_blueprint(bp)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(finish_render, app)
+    startup_timings['config'] = time.perf_counter() - start
 
+    if config['WARM_ON_START']:
+        startup_timings.update(warm_up(app))
+    startup_timings['total'] = time.perf_counter() - start
+    if startup_timings['total'] > config['STARTUP_BUDGET']:
+        stages = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in startup_timings.items())
+        logger.warning(f"Startup over its {config['STARTUP_BUDGET']:.2f}s budget: {stages}")
+    return app
 
 if __name__ == '__main__':
-    app.secret_key = os.urandom(24)
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
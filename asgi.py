@@ -0,0 +1,185 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+import app as recipehunter
+from app import create_app, current_client, rate_limiter, spoonacular
+from async_api import AsyncSpoonacularClient, BlockingClient
+from metrics import Trace, current_trace, observe_request
+from offline import StaleResults
+
+app = create_app()
+app.config.setdefault('ASYNC_POOL_SIZE', int(os.environ.get('ASYNC_POOL_SIZE', 200)))
+
+# Created lazily so the client binds to the server's event loop
+client: Optional[AsyncSpoonacularClient] = None
+
+
+def get_client() -> AsyncSpoonacularClient:
+    global client
+    if client is None:
+        client = AsyncSpoonacularClient(app.config['SPOONACULAR_URL'],
+                                        pool_size=app.config['ASYNC_POOL_SIZE'],
+                                        timeout=(3.05, app.config['SPOONACULAR_TIMEOUT']),
+                                        max_retries=app.config['SPOONACULAR_MAX_RETRIES'],
+                                        breaker=spoonacular.breaker,
+                                        rate_limiter=rate_limiter,
+                                        readings=spoonacular.readings)
+    return client
+
+
+async def in_thread(func: Callable, *args) -> Any:
+    # The search and recipe code is shared with the WSGI app and blocks on SQLite, so it runs on a worker
+    # thread that stays held while it waits; the Spoonacular calls it makes go out on this loop's async client
+    token = current_client.set(BlockingClient(get_client(), asyncio.get_running_loop()))
+    try:
+        return await asyncio.to_thread(func, *args)
+    finally:
+        current_client.reset(token)
+
+
+async def search_recipes(ingredients: List[str], avoid: List[str], diet: List[str], intolerances: List[str],
+                         api_key: str, number: int = 10) -> List[Dict]:
+    return await in_thread(recipehunter.search_recipes, ingredients, avoid, diet, intolerances, api_key, number)
+
+
+def wsgi_environ(scope: Dict, body: bytes = b'') -> Dict[str, Any]:
+    # Enough of PEP 3333 for Flask to route the request and read its headers
+    host, port = scope.get('server') or ('localhost', None)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': host,
+        'SERVER_PORT': str(port or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('',))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_flask(environ: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    result = app.wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], body
+
+
+async def read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def flask_page(scope, receive, send):
+    # The Flask view itself, so ETags, 304s, Cache-Control, compression and stale headers are the same as
+    # under the WSGI server; it runs on the pool in_thread uses, not on WsgiToAsgi's single thread
+    status, headers, body = await in_thread(call_flask, wsgi_environ(scope, await read_body(receive)))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_response(send, status: int, body: bytes, content_type: str, stale: Optional[str] = None):
+    headers = [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    if stale:
+        headers += [(b'warning', b'110 - "Response is Stale"'), (b'x-served-from', b'local'),
+                    (b'cache-control', b'no-cache')]
+    trace = current_trace.get()
+    if trace is not None:
+        headers.append((b'server-timing', trace.server_timing().encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def search_api(send, query: Dict[str, List[str]]) -> int:
+    try:
+        number = min(max(int(query.get('number', ['10'])[0]), 1), 100)
+    except ValueError:
+        await send_response(send, 400, b'{"error": "number must be an integer"}', 'application/json')
+        return 400
+    stale = None
+    try:
+        recipes = await search_recipes(query.get('ingredients', []), query.get('avoid', []), query.get('diet', []),
+                                       query.get('intolerances', []), app.config['API_KEY'], number)
+        status, payload = 200, {'recipes': recipes}
+        if isinstance(recipes, StaleResults):
+            stale = payload['stale'] = recipes.reason
+    except Exception as e:
+        status, payload = 502, {'error': f"An error occurred: {str(e)}"}
+    await send_response(send, status, json.dumps(payload).encode(), 'application/json', stale)
+    return status
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            get_client()
+            # Each request waiting on Spoonacular holds a worker thread, so allow as many as connections
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=app.config['ASYNC_POOL_SIZE'], thread_name_prefix='asgi'))
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if client is not None:
+                await client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+wsgi_application = WsgiToAsgi(app) if WsgiToAsgi is not None else None
+
+
+async def application(scope, receive, send):
+    # The pages that search or load recipes run on the thread pool; everything else goes through WsgiToAsgi
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['path'] == '/' and scope['method'] in ('GET', 'POST'):
+        return await flask_page(scope, receive, send)
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        if re.fullmatch(r'/recipe/\d+', scope['path']):
+            return await flask_page(scope, receive, send)
+        if scope['path'] == '/api/search':
+            trace = Trace()
+            current_trace.set(trace)
+            status = await search_api(send, parse_qs(scope['query_string'].decode()))
+            return observe_request('api_search', status, trace.elapsed())
+
+    if wsgi_application is None:
+        return await send_response(send, 501, b'Install asgiref to serve the remaining routes over ASGI', 'text/plain')
+    await wsgi_application(scope, receive, send)
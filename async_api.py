@@ -0,0 +1,152 @@
+from typing import Any, Dict, Optional, Tuple, Union
+import asyncio
+import random
+import time
+
+import requests
+
+try:
+    import httpx
+except ImportError:  # only needed for the ASGI entry point
+    httpx = None
+
+from http_client import RETRY_STATUSES, CircuitBreaker, UpstreamReadings, UpstreamUnavailable, parse_retry_after
+from metrics import observe_upstream, stage
+from ratelimit import TokenBucket
+from recipe_model import slim
+
+
+class AsyncSpoonacularClient:
+    def __init__(self, base_url: str = 'https://api.spoonacular.com', pool_size: int = 200,
+                 timeout: Union[float, Tuple[float, float]] = (3.05, 10), max_retries: int = 3,
+                 backoff_base: float = 0.25, backoff_max: float = 8, retry_after_max: float = 30,
+                 breaker: Optional[CircuitBreaker] = None, rate_limiter: Optional[TokenBucket] = None,
+                 rate_limit_wait: float = 5, readings: Optional[UpstreamReadings] = None):
+        if httpx is None:
+            raise ImportError("The async API layer needs httpx: pip install httpx")
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip('/'),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.rate_limiter = rate_limiter
+        self.rate_limit_wait = rate_limit_wait
+        self.readings = readings if readings is not None else UpstreamReadings()
+        self.calls = 0
+        self.retries = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Any, asyncio.Future] = {}
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None, cost: float = 1) -> Any:
+        # Identical requests already in flight share one upstream call
+        key = (path, tuple(sorted((name, str(value)) for name, value in (params or {}).items())))
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._get(path, params, cost)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]], cost: float) -> Any:
+        if not self.breaker.allow_request():
+            raise UpstreamUnavailable(f"Spoonacular circuit is open, not calling {path}")
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                waited = 0.0
+                while True:
+                    wait = self.rate_limiter.reserve(cost, waited, self.rate_limit_wait)
+                    if wait == 0:
+                        break
+                    await asyncio.sleep(wait)
+                    waited += wait
+            self.calls += 1
+            try:
+                with stage('upstream'):
+                    started = time.perf_counter()
+                    res = await self.client.get('/' + path.lstrip('/'), params=params)
+                    self.readings.record_latency(time.perf_counter() - started)
+            except (httpx.TransportError, httpx.TimeoutException):
+                observe_upstream(path, 'error')
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or not self.breaker.allow_request():
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                observe_upstream(path, res.status_code)
+                self.readings.record_quota(res.status_code, res.headers)
+                if res.status_code not in RETRY_STATUSES:
+                    if res.status_code < 500:
+                        self.breaker.record_success()
+                    res.raise_for_status()
+                    with stage('decode'):
+                        return res.json()
+                self.breaker.record_failure()
+                retry_after = parse_retry_after(res.headers.get('Retry-After'))
+                if (attempt >= self.max_retries or not self.breaker.allow_request()
+                        or (retry_after is not None and retry_after > self.retry_after_max)):
+                    res.raise_for_status()
+                delay = max(retry_after or 0, self.backoff(attempt))
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._in_flight),
+            'circuit': self.breaker.state,
+        }
+
+
+class BlockingClient:
+    # Lets code on a worker thread call an AsyncSpoonacularClient: the request runs on the client's event
+    # loop while the thread waits, so it shares the loop's connection pool and in-flight coalescing
+    def __init__(self, client: AsyncSpoonacularClient, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.loop = loop
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None, cost: float = 1) -> Any:
+        future = asyncio.run_coroutine_threadsafe(self.client.get(path, params=params, cost=cost), self.loop)
+        try:
+            return future.result()
+        except httpx.HTTPStatusError as e:
+            # Callers handle the sync client's errors, not httpx's; the status tells a missing recipe from an outage
+            response = requests.Response()
+            response.status_code, response.url = e.response.status_code, str(e.request.url)
+            raise requests.HTTPError(f"Spoonacular request for {path} failed: {e}", response=response) from e
+        except httpx.HTTPError as e:
+            raise UpstreamUnavailable(f"Spoonacular request for {path} failed: {e}") from e
+
+
+async def get_recipe_details(client: AsyncSpoonacularClient, recipe_id: int, api_key: str) -> Dict:
+    return slim(await client.get(f"recipes/{recipe_id}/information", params={'apiKey': api_key}))
@@ -0,0 +1,278 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from fake_spoonacular import INGREDIENTS, FakeSpoonacular, make_corpus
+from http_client import SpoonacularClient
+from matching import AvoidMatcher
+from recipe_index import RecipeIndex
+from recipe_model import Recipe, slim
+
+
+def best_of(func: Callable, repeat: int = 5, number: int = 20) -> float:
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def make_avoid_terms(count: int, seed: int = 0) -> List[str]:
+    words = INGREDIENTS + [f"{ingredient} {form}" for ingredient in INGREDIENTS
+                           for form in ('paste', 'powder', 'sauce', 'stock')]
+    return random.Random(seed).sample(words, count)
+
+
+def bench_avoid() -> List[Dict]:
+    def loop_filter(recipes, avoid):
+        return [recipe for recipe in recipes
+                if not any(ingredient.lower() in recipe['title'].lower() for ingredient in avoid)]
+
+    def matcher_title_filter(recipes, avoid):
+        matcher = AvoidMatcher(avoid)
+        return [recipe for recipe in recipes if not matcher.search(recipe['title'])]
+
+    def matcher_filter(recipes, avoid):
+        # Includes compiling the matcher, which happens once per query
+        return AvoidMatcher(avoid).filter(recipes)
+
+    rows = []
+    for recipe_count in (10, 100, 1000):
+        recipes = make_corpus(recipe_count)
+        for avoid_count in (5, 50):
+            avoid = make_avoid_terms(avoid_count)
+            rows.append({
+                'recipes': recipe_count,
+                'avoid_terms': avoid_count,
+                'loop_ms': best_of(lambda: loop_filter(recipes, avoid)) * 1000,
+                'matcher_title_ms': best_of(lambda: matcher_title_filter(recipes, avoid)) * 1000,
+                'matcher_full_ms': best_of(lambda: matcher_filter(recipes, avoid)) * 1000,
+            })
+    return rows
+
+
+def bench_index(corpus_size: int = 100_000) -> List[Dict]:
+    recipes = make_corpus(corpus_size)
+    index = RecipeIndex()
+    start = time.perf_counter()
+    index.add_many(recipes)
+    build_seconds = time.perf_counter() - start
+
+    queries = [
+        (['beef'], [], [], []),
+        (['beef', 'rice'], ['pasta'], [], []),
+        (['chicken', 'garlic', 'lemon'], ['milk'], [], ['dairy']),
+        ([], ['pork'], ['vegetarian'], ['gluten']),
+        (['spinach', 'eggs'], [], ['paleo'], ['peanut']),
+    ]
+    rows = []
+    for ingredients, avoid, diet, intolerances in queries:
+        rows.append({
+            'query': '+'.join(ingredients) or '-',
+            'hits': len(index.search(ingredients, avoid, diet, intolerances)),
+            'query_ms': best_of(lambda: index.search(ingredients, avoid, diet, intolerances, limit=10),
+                                repeat=3, number=5) * 1000,
+            'build_s': build_seconds,
+        })
+    return rows
+
+
+def bench_async(requests: int = 400, latency: float = 0.1, sync_workers: int = 8,
+                async_concurrency: int = 200) -> List[Dict]:
+    # Fetches distinct recipes so coalescing and caching cannot hide upstream latency
+    from async_api import AsyncSpoonacularClient, get_recipe_details as get_details_async
+
+    server = FakeSpoonacular(corpus_size=requests, latency=latency).start()
+    recipe_ids = list(range(1, requests + 1))
+    rows = []
+    try:
+        client = SpoonacularClient(server.url, pool_size=sync_workers)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sync_workers) as pool:
+            list(pool.map(lambda recipe_id: client.get(f"recipes/{recipe_id}/information"), recipe_ids))
+        elapsed = time.perf_counter() - start
+        rows.append({'mode': f"sync x{sync_workers}", 'requests': requests, 'seconds': elapsed,
+                     'per_second': requests / elapsed})
+
+        async def run_async():
+            client = AsyncSpoonacularClient(server.url, pool_size=async_concurrency)
+            limit = asyncio.Semaphore(async_concurrency)
+
+            async def fetch(recipe_id):
+                async with limit:
+                    return await get_details_async(client, recipe_id, 'benchmark')
+
+            try:
+                await asyncio.gather(*(fetch(recipe_id) for recipe_id in recipe_ids))
+            finally:
+                await client.aclose()
+
+        start = time.perf_counter()
+        asyncio.run(run_async())
+        elapsed = time.perf_counter() - start
+        rows.append({'mode': f"async x{async_concurrency}", 'requests': requests, 'seconds': elapsed,
+                     'per_second': requests / elapsed})
+    finally:
+        server.shutdown()
+    return rows
+
+
+def bench_render() -> List[Dict]:
+    from flask import render_template, render_template_string
+    import app as recipehunter
+
+    flask_app = recipehunter.create_app()
+    recipes = make_corpus(10)
+    context = {
+        'recipes': recipes,
+        'diet_options': recipehunter.DIET_OPTIONS,
+        'intolerance_options': recipehunter.INTOLERANCE_OPTIONS,
+    }
+    with open(flask_app.jinja_loader.searchpath[0] + '/index.html') as f:
+        index_source = f.read()
+
+    rows = []
+    with flask_app.test_request_context('/'):
+        # render_template_string compiles the source on every call, as home() used to
+        for name, render in (('index (string)', lambda: render_template_string(index_source, **context)),
+                             ('index (compiled)', lambda: render_template('index.html', **context)),
+                             ('recipe (compiled)', lambda: recipehunter.render_recipe_page(recipes[0],
+                                                                                          recipes[0]['summary']))):
+            rows.append({'template': name, 'render_us': best_of(render, number=200) * 1e6,
+                         'bytes': len(render().encode())})
+    return rows
+
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+timings = {'import': imported - start, **app.startup_timings}
+timings['total'] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def bench_startup(store_sizes=(0, 1000, 10_000), runs: int = 3) -> List[Dict]:
+    # Each run is a fresh interpreter, as for a newly scheduled instance; the fastest run is reported
+    from recipe_store import RecipeStore
+
+    rows = []
+    for size in store_sizes:
+        workdir = tempfile.mkdtemp(prefix='recipehunter-startup-')
+        env = dict(os.environ,
+                   RECIPE_STORE_PATH=os.path.join(workdir, 'recipes.sqlite3'),
+                   SAVED_SEARCHES_PATH=os.path.join(workdir, 'saved_searches.sqlite3'),
+                   SESSION_PATH=os.path.join(workdir, 'sessions.sqlite3'))
+        store = RecipeStore(env['RECIPE_STORE_PATH'])
+        for recipe in make_corpus(size):
+            store.put(recipe['id'], recipe, recipe['summary'])
+
+        results = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        best = min(results, key=lambda timings: timings['total'])
+        rows.append({'stored_recipes': size, **{f"{stage}_ms": seconds * 1000 for stage, seconds in best.items()}})
+    return rows
+
+
+def spoonacular_payload(recipe: Dict, rng: random.Random) -> Dict:
+    # Pad a corpus recipe out to the shape of a real /information response
+    unit = {'amount': 1.0, 'unitShort': 'cup', 'unitLong': 'cups'}
+    ingredients = [dict(item, id=rng.randint(1000, 99999), aisle='Produce', image=f"{item['name']}.jpg",
+                        consistency='SOLID', nameClean=item['name'], amount=1.0, unit='cup',
+                        meta=['fresh', 'chopped'], measures={'us': dict(unit), 'metric': dict(unit, unitShort='ml')})
+                   for item in recipe['extendedIngredients']]
+    return dict(
+        recipe,
+        extendedIngredients=ingredients,
+        vegetarian=rng.random() < 0.3, vegan=rng.random() < 0.1, glutenFree=rng.random() < 0.3,
+        dairyFree=rng.random() < 0.3, veryHealthy=False, cheap=False, veryPopular=False, sustainable=False,
+        lowFodmap=False, weightWatcherSmartPoints=rng.randint(1, 20), gaps='no', healthScore=rng.randint(1, 100),
+        creditsText='Example Kitchen', sourceName='Example Kitchen', pricePerServing=rng.uniform(50, 500),
+        cuisines=['American'], dishTypes=['lunch', 'main course', 'dinner'], occasions=[],
+        nutrition={'nutrients': [{'name': name, 'amount': rng.uniform(0, 500), 'unit': 'g',
+                                  'percentOfDailyNeeds': rng.uniform(0, 100)}
+                                 for name in ('Calories', 'Fat', 'Saturated Fat', 'Carbohydrates', 'Sugar',
+                                              'Cholesterol', 'Sodium', 'Protein', 'Fiber', 'Vitamin C',
+                                              'Calcium', 'Iron', 'Potassium', 'Magnesium')]},
+        analyzedInstructions=[{'name': '', 'steps': [
+            {'number': number, 'step': f"Add the {item['name']} and stir.",
+             'ingredients': [{'id': item['id'], 'name': item['name'], 'image': item['image']}], 'equipment': []}
+            for number, item in enumerate(ingredients, 1)]}],
+    )
+
+
+def traced_bytes(build: Callable) -> int:
+    # Bytes still allocated after build() returns, i.e. what holding its result costs
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def bench_memory(corpus_sizes=(1000, 10_000)) -> List[Dict]:
+    rows = []
+    for size in corpus_sizes:
+        rng = random.Random(0)
+        # Parse from JSON text each time, as a fresh response would be, so no strings are shared up front
+        responses = [json.dumps(spoonacular_payload(recipe, rng)) for recipe in make_corpus(size)]
+
+        def build_index():
+            index = RecipeIndex()
+            index.add_many(json.loads(text) for text in responses)
+            return index
+
+        raw = traced_bytes(lambda: [json.loads(text) for text in responses])
+        slim_dicts = traced_bytes(lambda: [slim(json.loads(text)) for text in responses])
+        records = traced_bytes(lambda: [Recipe.from_api(json.loads(text)) for text in responses])
+        rows.append({
+            'recipes': size,
+            'raw_bytes': raw // size,
+            'slim_dict_bytes': slim_dicts // size,
+            'record_bytes': records // size,
+            'index_bytes': traced_bytes(build_index) // size,
+            'reduction': raw / records,
+        })
+    return rows
+
+
+BENCHMARKS = {
+    'async': bench_async,
+    'render': bench_render,
+    'avoid': bench_avoid,
+    'index': bench_index,
+    'startup': bench_startup,
+    'memory': bench_memory,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recipe Hunter micro-benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--json', action='store_true', help='print raw results as JSON')
+    args = parser.parse_args()
+
+    results = BENCHMARKS[args.benchmark]()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        columns = list(results[0])
+        print('  '.join(f"{column:>16}" for column in columns))
+        for row in results:
+            print('  '.join(f"{value:>16.3f}" if isinstance(value, float) else f"{value:>16}" for value in row.values()))
@@ -0,0 +1,413 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Packed values at least this large are stored compressed
+COMPRESS_AT = 1024
+
+
+def normalize_terms(terms: Optional[Iterable[str]]) -> List[str]:
+    # Case-fold, strip and de-duplicate so "Beef, beef " and "beef" share an entry
+    return sorted({term.strip().casefold() for term in terms or [] if term and term.strip()})
+
+
+def canonical_query(ingredients: Iterable[str], avoid: Iterable[str], diet: Iterable[str],
+                    intolerances: Iterable[str], **extra: Any) -> str:
+    key = {
+        'ingredients': normalize_terms(ingredients),
+        'avoid': normalize_terms(avoid),
+        'diet': normalize_terms(diet),
+        'intolerances': normalize_terms(intolerances),
+    }
+    key.update(extra)
+    return json.dumps(key, sort_keys=True, separators=(',', ':'))
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._entries: 'OrderedDict[str, Tuple[Any, float]]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def evict(self, max_entries: int) -> int:
+        evicted = 0
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def purge_expired(self, now: float) -> int:
+        expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        row = self._conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), expires_at, time.time()))
+        self._conn.commit()
+
+    def delete(self, key: str):
+        self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+        self._conn.commit()
+
+    def evict(self, max_entries: int) -> int:
+        cursor = self._conn.execute('''
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+        self._conn.commit()
+        return cursor.rowcount
+
+    def purge_expired(self, now: float) -> int:
+        cursor = self._conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+        self._conn.commit()
+        return cursor.rowcount
+
+    def clear(self):
+        self._conn.execute('DELETE FROM cache')
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+def pack(value: Any) -> bytes:
+    # msgpack when it is installed, compact JSON otherwise, and zlib on top for large payloads.
+    # The first byte records the format so either build can read the other's entries.
+    if msgpack is not None:
+        kind, data = b'm', msgpack.packb(value, use_bin_type=True)
+    else:
+        kind, data = b'j', json.dumps(value, separators=(',', ':')).encode()
+    if len(data) >= COMPRESS_AT:
+        kind, data = kind.upper(), zlib.compress(data, 1)
+    return kind + data
+
+
+def unpack(blob: bytes) -> Any:
+    kind, data = blob[:1], blob[1:]
+    if kind.isupper():
+        kind, data = kind.lower(), zlib.decompress(data)
+    if kind == b'm':
+        if msgpack is None:
+            raise ValueError("Cache entry was written with msgpack, which is not installed")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+class SharedBackend:
+    # One SQLite file shared by every worker process on the host. Values are packed blobs; the totals and a
+    # change log are kept by triggers, so writes, size accounting and invalidation commit atomically together.
+    # A small per-process copy of hot entries is dropped as soon as another process changes or removes them.
+    def __init__(self, path: Path, max_bytes: int = 256 * 1024 * 1024, local_entries: int = 256,
+                 touch_interval: float = 60):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.local_entries = local_entries
+        self.touch_interval = touch_interval
+        self.local: 'OrderedDict[str, Tuple[Any, float]]' = OrderedDict()
+        self.local_hits = 0
+        self.invalidations = 0
+        self.evicted = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'PRAGMA mmap_size={max_bytes}')
+        self._conn.executescript('''
+            BEGIN;
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_totals (id, entries, bytes) VALUES (0, 0, 0);
+            CREATE TABLE IF NOT EXISTS cache_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+                UPDATE cache_totals SET entries = entries + 1, bytes = bytes + NEW.size;
+            END;
+            CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF value ON cache BEGIN
+                UPDATE cache_totals SET bytes = bytes + NEW.size - OLD.size;
+                INSERT INTO cache_changes (key) VALUES (NEW.key);
+            END;
+            CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+                UPDATE cache_totals SET entries = entries - 1, bytes = bytes - OLD.size;
+                INSERT INTO cache_changes (key) VALUES (OLD.key);
+            END;
+            COMMIT;
+        ''')
+        self._seen = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM cache_changes').fetchone()[0]
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _sync(self, own_writes: bool = False):
+        # data_version only moves when another connection commits, so this is free while nobody writes.
+        # It does not see this connection's own commits, so evictions made here ask for the log explicitly
+        data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version and not own_writes:
+            return
+        self._data_version = data_version
+        rows = self._conn.execute('SELECT seq, key FROM cache_changes WHERE seq > ? ORDER BY seq',
+                                  (self._seen,)).fetchall()
+        oldest = self._conn.execute('SELECT MIN(seq) FROM cache_changes').fetchone()[0]
+        if oldest is not None and oldest > self._seen + 1:
+            # The log was trimmed past what this process has seen, so nothing local can be trusted
+            self.invalidations += len(self.local)
+            self.local.clear()
+        for seq, key in rows:
+            if self.local.pop(key, None) is not None:
+                self.invalidations += 1
+            self._seen = seq
+
+    def _remember(self, key: str, entry: Tuple[Any, float]):
+        self.local[key] = entry
+        self.local.move_to_end(key)
+        while len(self.local) > self.local_entries:
+            self.local.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        self._sync()
+        entry = self.local.get(key)
+        if entry is not None:
+            self.local.move_to_end(key)
+            self.local_hits += 1
+            return entry
+        row = self._conn.execute('SELECT value, expires_at, accessed_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > self.touch_interval:
+            # Recency only needs to be roughly right for eviction, so reads rarely write
+            self._conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+        entry = (unpack(row[0]), row[1])
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key: str, value: Any, expires_at: float) -> int:
+        blob = pack(value)
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.execute('''
+                INSERT INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,
+                    expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+            ''', (key, blob, len(blob), expires_at, now))
+            evicted = self._evict_bytes(now)
+            self._conn.execute('''
+                DELETE FROM cache_changes WHERE seq <= (SELECT MAX(seq) FROM cache_changes) - 10000
+            ''')
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._sync(own_writes=bool(evicted))
+        # A value larger than the whole budget evicts itself
+        if not evicted or self._conn.execute('SELECT 1 FROM cache WHERE key = ?', (key,)).fetchone():
+            self._remember(key, (value, expires_at))
+        self.evicted += evicted
+        return evicted
+
+    def _evict_bytes(self, now: float) -> int:
+        total = self._conn.execute('SELECT bytes FROM cache_totals').fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        # Expired entries go first, then the least recently used until the file is back under budget
+        evicted = self._conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,)).rowcount
+        while self._conn.execute('SELECT bytes FROM cache_totals').fetchone()[0] > self.max_bytes:
+            removed = self._conn.execute('''
+                DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT 64)
+            ''').rowcount
+            if not removed:
+                break
+            evicted += removed
+        return evicted
+
+    def _write(self, sql: str, params: Tuple = ()) -> int:
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            count = self._conn.execute(sql, params).rowcount
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def delete(self, key: str):
+        self._write('DELETE FROM cache WHERE key = ?', (key,))
+        self.local.pop(key, None)
+
+    def evict(self, max_entries: int) -> int:
+        evicted = self._write('''
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+        self._sync(own_writes=bool(evicted))
+        return evicted
+
+    def purge_expired(self, now: float) -> int:
+        purged = self._write('DELETE FROM cache WHERE expires_at <= ?', (now,))
+        self.local = OrderedDict((key, entry) for key, entry in self.local.items() if entry[1] > now)
+        return purged
+
+    def clear(self):
+        self._write('DELETE FROM cache')
+        self.local.clear()
+
+    def __len__(self):
+        return self._conn.execute('SELECT entries FROM cache_totals').fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._conn.execute('SELECT entries, bytes FROM cache_totals').fetchone()
+        return {
+            'path': str(self.path),
+            'serializer': 'msgpack' if msgpack is not None else 'json',
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'local_entries': len(self.local),
+            'local_hits': self.local_hits,
+            'invalidations': self.invalidations,
+            'evicted_for_size': self.evicted,
+        }
+
+
+class TTLCache:
+    def __init__(self, backend=None, ttl: float = 3600, max_entries: int = 1000):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.time():
+                    self.hits += 1
+                    return value
+            # Expired entries stay around for get_stale() until evicted
+            self.misses += 1
+            return default
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is None:
+                return default
+            self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            # Backends that enforce their own size budget report what they evicted
+            self.evictions += self.backend.set(key, value, now + (self.ttl if ttl is None else ttl)) or 0
+            if len(self.backend) > self.max_entries:
+                # Drop expired entries first, then fall back to least recently used
+                self.evictions += self.backend.purge_expired(now)
+                self.evictions += self.backend.evict(self.max_entries)
+
+    def delete(self, key: str):
+        with self._lock:
+            self.backend.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+            self.hits = self.misses = self.evictions = self.stale_hits = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'entries': len(self.backend),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale_hits': self.stale_hits,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                **({'shared': self.backend.stats()} if isinstance(self.backend, SharedBackend) else {}),
+            }
+
+
+def make_cache(backend: str = 'memory', path: Optional[Path] = None, ttl: float = 3600,
+               max_entries: int = 1000, max_bytes: int = 256 * 1024 * 1024) -> TTLCache:
+    if backend == 'memory':
+        return TTLCache(MemoryBackend(), ttl=ttl, max_entries=max_entries)
+    if backend == 'sqlite':
+        return TTLCache(SQLiteBackend(path), ttl=ttl, max_entries=max_entries)
+    if backend == 'shared':
+        return TTLCache(SharedBackend(path, max_bytes=max_bytes), ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Unknown cache backend: {backend}")
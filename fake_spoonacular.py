@@ -0,0 +1,151 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+INGREDIENTS = [
+    "chicken", "beef", "pork", "pasta", "rice", "potatoes", "onions", "garlic",
+    "tomatoes", "cheese", "eggs", "milk", "bread", "butter", "olive oil",
+    "salt", "pepper", "sugar", "flour", "carrots", "celery", "bell peppers",
+    "broccoli", "spinach", "lettuce", "corn", "beans", "mushrooms", "lemon", "lime"
+]
+DIETS = ["gluten free", "ketogenic", "vegetarian", "pescetarian", "paleo", "primal", "whole30"]
+DISHES = ["Stew", "Bake", "Salad", "Soup", "Stir Fry", "Casserole", "Tacos", "Curry", "Skillet", "Roast"]
+
+
+def make_corpus(size: int = 500, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    recipes = []
+    for recipe_id in range(1, size + 1):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(3, 8))
+        title = f"{ingredients[0].title()} and {ingredients[1].title()} {rng.choice(DISHES)}"
+        recipes.append({
+            'id': recipe_id,
+            'title': title,
+            'summary': f"{title} is a simple dish made with {', '.join(ingredients)}.",
+            'instructions': ' '.join(f"Add the {ingredient}." for ingredient in ingredients),
+            'sourceUrl': f"https://example.com/recipes/{recipe_id}",
+            'diets': rng.sample(DIETS, rng.randint(0, 2)),
+            'extendedIngredients': [
+                {'name': ingredient, 'original': f"{rng.randint(1, 4)} cups {ingredient}"}
+                for ingredient in ingredients
+            ],
+            'readyInMinutes': rng.choice((15, 20, 30, 45, 60, 90)),
+            'servings': rng.randint(1, 8),
+            'image': f"https://example.com/images/{recipe_id}-556x370.jpg",
+        })
+    return recipes
+
+
+class FakeSpoonacular(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), corpus_size: int = 500, latency: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, jitter: float = 0.0):
+        super().__init__(address, FakeSpoonacularHandler)
+        self.recipes = {recipe['id']: recipe for recipe in make_corpus(corpus_size, seed)}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        # Requests per endpoint, e.g. {'complexSearch': 12, 'information': 30}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeSpoonacular':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def search(self, query: Dict[str, List[str]]) -> Dict:
+        def terms(name):
+            return [term.strip().lower() for term in query.get(name, [''])[0].split(',') if term.strip()]
+
+        include, exclude, diets = terms('includeIngredients'), terms('excludeIngredients'), terms('diet')
+        offset = int(query.get('offset', ['0'])[0])
+        number = int(query.get('number', ['10'])[0])
+        matches = []
+        for recipe in self.recipes.values():
+            names = {item['name'] for item in recipe['extendedIngredients']}
+            if (all(term in names for term in include) and not any(term in names for term in exclude)
+                    and all(diet in recipe['diets'] for diet in diets)):
+                matches.append(recipe)
+        return {
+            'results': matches[offset:offset + number],
+            'offset': offset,
+            'number': number,
+            'totalResults': len(matches),
+        }
+
+
+class FakeSpoonacularHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        with server._lock:
+            server.requests += 1
+            server.calls[url.path.rsplit('/', 1)[-1]] += 1
+            fail = server.rng.random() < server.error_rate
+            delay = server.latency + (server.rng.uniform(0, server.jitter) if server.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self.send_json(503, {'message': 'Injected failure'}, {'Retry-After': '0'})
+
+        query = parse_qs(url.query)
+        if url.path == '/recipes/complexSearch':
+            return self.send_json(200, server.search(query))
+        if url.path == '/recipes/informationBulk':
+            recipe_ids = [int(recipe_id) for recipe_id in query.get('ids', [''])[0].split(',') if recipe_id.strip()]
+            return self.send_json(200, [server.recipes[recipe_id] for recipe_id in recipe_ids
+                                        if recipe_id in server.recipes])
+
+        match = re.fullmatch(r'/recipes/(\d+)/(information|summary)', url.path)
+        recipe = match and server.recipes.get(int(match.group(1)))
+        if not recipe:
+            return self.send_json(404, {'message': 'Not found'})
+        if match.group(2) == 'summary':
+            return self.send_json(200, {'id': recipe['id'], 'title': recipe['title'], 'summary': recipe['summary']})
+        return self.send_json(200, recipe)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Spoonacular recipe API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeSpoonacular((args.host, args.port), args.recipes, args.latency, args.error_rate, args.seed,
+                             args.jitter)
+    print(f"Fake Spoonacular listening on {server.url}")
+    server.serve_forever()
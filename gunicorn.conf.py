@@ -0,0 +1,28 @@
+# Production settings, picked up by running `gunicorn` from this directory.
+# SERVER_MODE=asgi serves asgi.application on uvicorn workers instead of the WSGI app on threads.
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# The master builds the app once (config, index, templates) and forks warm workers from it,
+# so no worker accepts traffic before the warm-up in create_app() has finished
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+
+if os.environ.get('SERVER_MODE') == 'asgi':
+    wsgi_app = 'asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:create_app()'
+    worker_class = 'gthread'
+
+
+def post_fork(server, worker):
+    # Connections, pools and threads created while preloading belong to the master; the index is kept
+    from app import reset_services
+    reset_services()
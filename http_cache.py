@@ -0,0 +1,84 @@
+from typing import Dict, Optional
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import Request, Response
+
+from cache import TTLCache
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    # Lets a view answer 304 from a version it already knows, before doing any rendering
+    for encoding in (None, 'br', 'gzip'):
+        representation = f"{etag}-{encoding}" if encoding else etag
+        if request.if_none_match.contains(representation):
+            response = Response(status=304)
+            response.set_etag(representation)
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+
+def apply_http_caching(request: Request, response: Response, policies: Dict[str, str],
+                       variants: TTLCache, min_size: int = 1024) -> Response:
+    # Per-route Cache-Control, strong ETags, conditional 304s and gzip/brotli for one response
+    if request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304):
+        return response
+
+    policy = policies.get(request.endpoint)
+    if policy and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = policy
+    if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+        return response
+
+    body = response.get_data()
+    etag, _ = response.get_etag()
+    if etag is None:
+        etag = hashlib.sha1(body).hexdigest()
+
+    encoding = None
+    if len(body) >= min_size and 'Content-Encoding' not in response.headers:
+        encoding = choose_encoding(request)
+        response.vary.add('Accept-Encoding')
+
+    # Each encoding is a different representation, so it gets its own strong ETag
+    representation = f"{etag}-{encoding}" if encoding else etag
+    response.set_etag(representation)
+    if request.if_none_match.contains(representation):
+        not_modified = Response(status=304, headers={
+            name: value for name, value in response.headers.items()
+            if name in ('ETag', 'Cache-Control', 'Vary', 'Expires', 'Last-Modified')
+        })
+        return not_modified
+
+    if encoding:
+        # Only publicly cacheable pages (e.g. recipe details) are worth keeping precompressed
+        shared = policy is not None and policy.startswith('public')
+        compressed = variants.get(representation) if shared else None
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if shared:
+                variants.set(representation, compressed)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,178 @@
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple, Union
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import observe_upstream, stage
+from ratelimit import SingleFlight, TokenBucket
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow_request(self) -> bool:
+        # While half-open every caller may probe; the first success closes the circuit again
+        return self.state != 'open'
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class UpstreamReadings:
+    # What Spoonacular's responses say about it, shared by the sync and async clients so the health check
+    # sees every response whichever client made it
+    def __init__(self):
+        self.quota_used: Optional[float] = None
+        self.quota_left: Optional[float] = None
+        # Running totals, so a caller can work out the average latency over any stretch of responses
+        self.responses = 0
+        self.response_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_quota(self, status_code: int, headers):
+        # Spoonacular reports the day's point usage on every response, and answers 402 once it is spent
+        for header, attr in (('X-API-Quota-Used', 'quota_used'), ('X-API-Quota-Left', 'quota_left')):
+            try:
+                setattr(self, attr, float(headers[header]))
+            except (KeyError, ValueError):
+                pass
+        if status_code == 402:
+            self.quota_left = 0.0
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self.responses += 1
+            self.response_seconds += seconds
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class SpoonacularClient:
+    def __init__(self, base_url: str = 'https://api.spoonacular.com', pool_size: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = (3.05, 10), max_retries: int = 3,
+                 backoff_base: float = 0.25, backoff_max: float = 8, retry_after_max: float = 30,
+                 breaker: Optional[CircuitBreaker] = None, rate_limiter: Optional[TokenBucket] = None,
+                 rate_limit_wait: float = 5, readings: Optional[UpstreamReadings] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.rate_limiter = rate_limiter
+        self.rate_limit_wait = rate_limit_wait
+        self.single_flight = SingleFlight()
+        self.readings = readings if readings is not None else UpstreamReadings()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.calls = 0
+        self.retries = 0
+
+    def backoff(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+            timeout: Union[float, Tuple[float, float], None] = None, cost: float = 1) -> Any:
+        # Identical requests already in flight are answered by that request instead of a new one
+        key = (path, tuple(sorted((name, str(value)) for name, value in (params or {}).items())))
+        return self.single_flight.do(key, lambda: self._get(path, params, timeout, cost))
+
+    def _get(self, path: str, params: Optional[Dict[str, Any]],
+             timeout: Union[float, Tuple[float, float], None], cost: float) -> Any:
+        if not self.breaker.allow_request():
+            raise UpstreamUnavailable(f"Spoonacular circuit is open, not calling {path}")
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(cost, timeout=self.rate_limit_wait)
+            self.calls += 1
+            try:
+                with stage('upstream'):
+                    started = time.perf_counter()
+                    res = self.session.get(url, params=params, timeout=timeout or self.timeout)
+                    self.readings.record_latency(time.perf_counter() - started)
+            except (requests.ConnectionError, requests.Timeout):
+                observe_upstream(path, 'error')
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or not self.breaker.allow_request():
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                observe_upstream(path, res.status_code)
+                self.readings.record_quota(res.status_code, res.headers)
+                if res.status_code not in RETRY_STATUSES:
+                    if res.status_code < 500:
+                        self.breaker.record_success()
+                    res.raise_for_status()
+                    with stage('decode'):
+                        return res.json()
+                self.breaker.record_failure()
+                retry_after = parse_retry_after(res.headers.get('Retry-After'))
+                if (attempt >= self.max_retries or not self.breaker.allow_request()
+                        or (retry_after is not None and retry_after > self.retry_after_max)):
+                    res.raise_for_status()
+                delay = max(retry_after or 0, self.backoff(attempt))
+            attempt += 1
+            self.retries += 1
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'quota_used': self.readings.quota_used,
+            'quota_left': self.readings.quota_left,
+            'rate_limit': self.rate_limiter.stats() if self.rate_limiter is not None else None,
+            'single_flight': self.single_flight.stats(),
+        }
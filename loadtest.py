@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+
+from fake_spoonacular import INGREDIENTS, FakeSpoonacular, make_corpus
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class LoadRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def timed(self, route: str, http: requests.Session, method: str, url: str, **kwargs) -> Optional[requests.Response]:
+        start = time.perf_counter()
+        try:
+            response = http.request(method, url, timeout=30, **kwargs)
+            failed = response.status_code >= 400
+        except requests.RequestException:
+            response, failed = None, True
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if failed:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def summary(self, seconds: float) -> Dict:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            routes[route] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(route, 0),
+                'mean_ms': sum(latencies) / len(latencies) * 1000,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'per_second': len(latencies) / seconds,
+            }
+        everything = sorted(latency for latencies in self.latencies.values() for latency in latencies)
+        routes['all'] = {
+            'requests': len(everything),
+            'errors': sum(self.errors.values()),
+            'mean_ms': sum(everything) / len(everything) * 1000 if everything else 0.0,
+            'p50_ms': percentile(everything, 50) * 1000,
+            'p95_ms': percentile(everything, 95) * 1000,
+            'p99_ms': percentile(everything, 99) * 1000,
+            'per_second': len(everything) / seconds,
+        }
+        return routes
+
+
+def user_session(base_url: str, recorder: LoadRecorder, rng: random.Random, number: int):
+    # One visit: open the form, search, read a couple of recipes, and sometimes save and reload the search
+    http = requests.Session()
+    recorder.timed('home (GET)', http, 'GET', base_url + '/')
+
+    ingredients = rng.sample(INGREDIENTS, rng.randint(1, 2))
+    response = recorder.timed('home (search)', http, 'POST', base_url + '/', data={'ingredients': ingredients})
+    recipe_ids = re.findall(r'/recipe/(\d+)', response.text) if response is not None else []
+    for recipe_id in rng.sample(recipe_ids, min(len(recipe_ids), rng.randint(1, 2))):
+        recorder.timed('recipe_details', http, 'GET', f"{base_url}/recipe/{recipe_id}")
+
+    if rng.random() < 0.3:
+        name = f"load test {number}"
+        recorder.timed('save_search', http, 'POST', base_url + '/save_search', json={
+            'name': name, 'ingredients': ingredients, 'avoid': [], 'diet': [], 'intolerances': [],
+            'recipes': [{'id': int(recipe_id)} for recipe_id in recipe_ids],
+        })
+        recorder.timed('load_saved_search', http, 'GET', f"{base_url}/load_saved_search/{name}")
+    recorder.timed('get_saved_searches', http, 'GET', base_url + '/get_saved_searches', params={'limit': 50})
+
+
+def run_load(base_url: str, concurrency: int, sessions: int, seed: int = 0) -> Dict:
+    recorder = LoadRecorder()
+    rngs = [random.Random(seed * 100003 + number) for number in range(sessions)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda number: user_session(base_url, recorder, rngs[number], number), range(sessions)))
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'routes': recorder.summary(seconds)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_recipe_store(path: str, corpus_size: int, seed: int):
+    # Fills the recipe store with the fake corpus, as if every recipe had been fetched before
+    from recipe_model import slim
+    from recipe_store import RecipeStore
+
+    store = RecipeStore(path)
+    for recipe in make_corpus(corpus_size, seed):
+        store.put(recipe['id'], slim(recipe), recipe['summary'])
+
+
+def run_local(concurrency: int, sessions: int, seed: int, corpus_size: int, latency: float, jitter: float,
+              error_rate: float, rate: float, offline: bool = False) -> Dict:
+    # Serves the app in-process against a fake Spoonacular, with its stores in a throwaway directory.
+    # Offline runs start no fake at all and answer everything from a pre-filled recipe store
+    fake = None
+    if not offline:
+        fake = FakeSpoonacular(corpus_size=corpus_size, latency=latency, jitter=jitter, error_rate=error_rate,
+                               seed=seed).start()
+    workdir = tempfile.mkdtemp(prefix='recipehunter-load-')
+    if offline:
+        seed_recipe_store(os.path.join(workdir, 'recipes.sqlite3'), corpus_size, seed)
+    os.environ.update({
+        # Nothing listens on port 9 locally, so a stray upstream call fails fast instead of leaving the machine
+        'SPOONACULAR_URL': fake.url if fake else 'http://127.0.0.1:9',
+        'OFFLINE_MODE': 'on' if offline else os.environ.get('OFFLINE_MODE', 'auto'),
+        'SPOONACULAR_RATE': str(rate),
+        'SPOONACULAR_BURST': str(rate),
+        'SEARCH_CACHE_PATH': os.path.join(workdir, 'search_cache.sqlite3'),
+        'SUMMARY_CACHE_PATH': os.path.join(workdir, 'summary_cache.sqlite3'),
+        'RECIPE_STORE_PATH': os.path.join(workdir, 'recipes.sqlite3'),
+        'SAVED_SEARCHES_PATH': os.path.join(workdir, 'saved_searches.sqlite3'),
+        'SESSION_PATH': os.path.join(workdir, 'sessions.sqlite3'),
+        # Background refreshes would make upstream call counts differ between runs
+        'SAVED_SEARCH_REFRESH_PERIOD': '0',
+    })
+    from werkzeug.serving import make_server
+    import app as recipehunter
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, recipehunter.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        result = run_load(f"http://127.0.0.1:{server.server_port}", concurrency, sessions, seed)
+    finally:
+        server.shutdown()
+        if fake:
+            fake.shutdown()
+
+    requests_served = result['routes']['all']['requests']
+    calls = fake.requests if fake else 0
+    result['upstream'] = {
+        'calls': calls,
+        'per_request': calls / requests_served if requests_served else 0.0,
+        'by_endpoint': dict(fake.calls) if fake else {},
+    }
+    if fake:
+        result['fake_spoonacular'] = {'corpus_size': corpus_size, 'latency': latency, 'jitter': jitter,
+                                      'error_rate': error_rate}
+    else:
+        result['offline'] = {'corpus_size': corpus_size}
+    return result
+
+
+def compare(result: Dict, baseline: Dict):
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    for route, row in result['routes'].items():
+        old = baseline['routes'].get(route)
+        if old is None:
+            continue
+        changes = []
+        for field in ('p50_ms', 'p95_ms', 'p99_ms', 'per_second'):
+            if old[field]:
+                changes.append(f"{field} {(row[field] - old[field]) / old[field] * 100:+.1f}%")
+        print(f"  {route:<20} " + '  '.join(changes))
+    if 'upstream' in result and 'upstream' in baseline:
+        print(f"  {'upstream calls':<20} {baseline['upstream']['calls']} -> {result['upstream']['calls']}")
+
+
+def print_report(result: Dict):
+    columns = ('requests', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'per_second')
+    print(f"{'route':<20}" + ''.join(f"{column:>12}" for column in columns))
+    for route, row in result['routes'].items():
+        print(f"{route:<20}" + ''.join(f"{row[column]:>12.1f}" if isinstance(row[column], float)
+                                       else f"{row[column]:>12}" for column in columns))
+    if 'upstream' in result:
+        upstream = result['upstream']
+        print(f"\nUpstream calls: {upstream['calls']} ({upstream['per_request']:.2f} per request) "
+              + ', '.join(f"{endpoint} {count}" for endpoint, count in sorted(upstream['by_endpoint'].items())))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the Recipe Hunter pages against a fake Spoonacular')
+    parser.add_argument('--url', help='load test an already running server instead of one started in-process')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--sessions', type=int, default=200, help='user visits to simulate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--recipes', type=int, default=2000, help='size of the fake corpus')
+    parser.add_argument('--latency', type=float, default=0.1, help='fake upstream latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='extra random upstream latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate', type=float, default=1000, help='rate limit budget in points per second')
+    parser.add_argument('--offline', action='store_true',
+                        help='serve from a pre-filled recipe store in offline mode, with no upstream at all')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    if args.url:
+        result = run_load(args.url.rstrip('/'), args.concurrency, args.sessions, args.seed)
+    else:
+        result = run_local(args.concurrency, args.sessions, args.seed, args.recipes, args.latency, args.jitter,
+                           args.error_rate, args.rate, args.offline)
+    result = {'commit': git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'concurrency': args.concurrency, 'sessions': args.sessions, 'seed': args.seed, **result}
+
+    print_report(result)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
@@ -0,0 +1,83 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+# Alternative names Spoonacular uses for the same ingredient
+SYNONYMS = {
+    'bell pepper': ['capsicum', 'sweet pepper'],
+    'beef': ['steak', 'ground chuck', 'sirloin'],
+    'cilantro': ['coriander'],
+    'chickpea': ['garbanzo bean'],
+    'eggplant': ['aubergine'],
+    'green onion': ['scallion', 'spring onion'],
+    'pasta': ['spaghetti', 'penne', 'macaroni', 'fettuccine', 'linguine', 'noodle'],
+    'pork': ['bacon', 'ham', 'prosciutto', 'pancetta'],
+    'shrimp': ['prawn'],
+    'zucchini': ['courgette'],
+}
+
+
+def singular(term: str) -> str:
+    if term.endswith('ies') and len(term) > 4:
+        return term[:-3] + 'y'
+    if term.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return term[:-2]
+    if term.endswith('s') and not term.endswith('ss') and len(term) > 3:
+        return term[:-1]
+    return term
+
+
+def term_pattern(term: str) -> str:
+    base = singular(term)
+    if base.endswith('y') and base[-2:-1] not in 'aeiou':
+        return re.escape(base[:-1]) + '(?:y|ies)'
+    return re.escape(base) + '(?:e?s)?'
+
+
+class AvoidMatcher:
+    def __init__(self, avoid: Iterable[str]):
+        terms = set()
+        for term in avoid:
+            term = ' '.join(term.casefold().split())
+            if not term:
+                continue
+            terms.add(term)
+            terms.update(SYNONYMS.get(singular(term), []))
+        self.terms = sorted(terms)
+        if self.terms:
+            # One alternation for every term, longest first so multi-word terms win. Text is
+            # case-folded before matching, which is much cheaper than re.IGNORECASE
+            alternatives = sorted((term_pattern(term) for term in self.terms), key=len, reverse=True)
+            self.pattern: Optional[re.Pattern] = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b')
+        else:
+            self.pattern = None
+
+    def search(self, text: str) -> Optional[str]:
+        if self.pattern is None or not text:
+            return None
+        match = self.pattern.search(text.casefold())
+        return match.group(0) if match else None
+
+    def excludes(self, recipe: Dict) -> bool:
+        return self.excludes_names(recipe.get('title') or '', (item.get('nameClean') or item.get('name') or ''
+                                                               for item in recipe.get('extendedIngredients') or ()))
+
+    def excludes_names(self, title: str, names: Iterable[str]) -> bool:
+        if self.pattern is None:
+            return False
+        # Title and every ingredient name on its own line, searched in one pass
+        return self.search('\n'.join((title, *names))) is not None
+
+    def filter(self, recipes: Iterable[Dict]) -> List[Dict]:
+        if self.pattern is None:
+            return list(recipes)
+        return [recipe for recipe in recipes if not self.excludes(recipe)]
+
+
+@lru_cache(maxsize=256)
+def _compile(avoid: Tuple[str, ...]) -> AvoidMatcher:
+    return AvoidMatcher(avoid)
+
+
+def compile_avoid_matcher(avoid: Iterable[str]) -> AvoidMatcher:
+    return _compile(tuple(sorted(set(avoid))))
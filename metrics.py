@@ -0,0 +1,165 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: Labels) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append(f"{name}_bucket{format_labels(labels, ('le', le))} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {self.count}")
+        return lines
+
+
+class Registry:
+    # Counters, histograms and scrape-time gauges rendered in the Prometheus text format
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]] = []
+
+    def describe(self, name: str, kind: str, text: str):
+        self.help[name] = (kind, text)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]):
+        # Collectors yield (name, labels, value) gauges read from other components at scrape time
+        self.collectors.append(collector)
+
+    def _header(self, name: str, default_kind: str) -> List[str]:
+        kind, text = self.help.get(name, (default_kind, ''))
+        return ([f"# HELP {name} {text}"] if text else []) + [f"# TYPE {name} {kind}"]
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines += self._header(name, 'counter')
+                lines += [f"{name}{format_labels(labels)} {value}" for labels, value in sorted(series.items())]
+            for name, series in sorted(self.histograms.items()):
+                lines += self._header(name, 'histogram')
+                for labels, histogram in sorted(series.items()):
+                    lines += histogram.samples(name, labels)
+
+        gauges: Dict[str, List[str]] = {}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                if value is None:
+                    continue
+                gauges.setdefault(name, []).append(
+                    f"{name}{format_labels(tuple(sorted(labels.items())))} {float(value)}")
+        for name, samples in sorted(gauges.items()):
+            lines += self._header(name, 'gauge') + samples
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REGISTRY.describe('recipehunter_requests_total', 'counter', 'HTTP requests served, by endpoint and status code')
+REGISTRY.describe('recipehunter_request_seconds', 'histogram', 'Time to produce a response, by endpoint')
+REGISTRY.describe('recipehunter_stage_seconds', 'histogram', 'Time spent in each stage of a request')
+REGISTRY.describe('recipehunter_upstream_requests_total', 'counter',
+                  'Spoonacular calls, by endpoint and status code ("error" for transport failures)')
+
+
+class Trace:
+    # Stage timings for one request, reported back in its Server-Timing header
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        with self._lock:
+            stages = list(self.stages.items())
+        stages.append(('total', self.elapsed()))
+        return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages)
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+
+
+def record_stage(name: str, seconds: float):
+    REGISTRY.observe('recipehunter_stage_seconds', seconds, {'stage': name})
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    # Usable as a context manager or as a decorator on a plain function
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def propagate(func: Callable) -> Callable:
+    # Carry the caller's trace into a worker thread; call once per submission
+    context = copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def observe_request(endpoint: str, status: int, seconds: float):
+    REGISTRY.inc('recipehunter_requests_total', {'endpoint': endpoint, 'status': str(status)})
+    REGISTRY.observe('recipehunter_request_seconds', seconds, {'endpoint': endpoint})
+
+
+def observe_upstream(path: str, status):
+    # "recipes/123/information" and "recipes/456/information" share one series
+    REGISTRY.inc('recipehunter_upstream_requests_total',
+                 {'endpoint': path.rstrip('/').rsplit('/', 1)[-1], 'status': str(status)})
@@ -0,0 +1,81 @@
+from typing import Dict, Iterable, Optional
+import threading
+import time
+
+from http_client import SpoonacularClient
+
+OFFLINE_MODES = ('auto', 'on', 'off')
+
+
+class StaleResults(list):
+    # Search results answered from local data instead of Spoonacular; reason says why
+    def __init__(self, recipes: Iterable[Dict], reason: str):
+        super().__init__(recipes)
+        self.reason = reason
+
+
+class UpstreamHealth:
+    # Decides when to stop waiting on Spoonacular and serve from local data. In 'auto' mode that is
+    # while the circuit is open, or for a cooldown after the quota runs out or responses get too slow;
+    # the first call after the cooldown is the health check that decides whether to go back online.
+    # The client's readings, shared with the async client, are only read: what has been acted on is tracked
+    # here by response count
+    def __init__(self, client: SpoonacularClient, mode: str = 'auto', slow_after: float = 3,
+                 min_quota: float = 0, cooldown: float = 60, smoothing: float = 0.2):
+        if mode not in OFFLINE_MODES:
+            raise ValueError(f"Unknown offline mode: {mode}")
+        self.client = client
+        self.mode = mode
+        self.slow_after = slow_after
+        self.min_quota = min_quota
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._tripped_until = 0.0
+        self._trip_reason: Optional[str] = None
+        # Moving average of the responses seen so far, restarted after every trip
+        self.latency: Optional[float] = None
+        self._responses = 0
+        self._response_seconds = 0.0
+        # Quota readings from this response or earlier have been acted on already
+        self._quota_acted_on = -1
+        self.trips = 0
+
+    def offline_reason(self) -> Optional[str]:
+        # None while upstream should be called
+        if self.mode == 'on':
+            return 'Recipe Hunter is in offline mode'
+        if self.mode == 'off':
+            return None
+        if self.client.breaker.state == 'open':
+            return 'Spoonacular is unreachable'
+        with self._lock:
+            now = time.monotonic()
+            if now < self._tripped_until:
+                return self._trip_reason
+            readings = self.client.readings
+            responses, seconds = readings.responses, readings.response_seconds
+            if responses > self._responses:
+                # Average of the responses since the last look, folded into the moving average
+                window = (seconds - self._response_seconds) / (responses - self._responses)
+                self.latency = window if self.latency is None else self.latency + self.smoothing * (window - self.latency)
+                self._responses, self._response_seconds = responses, seconds
+            quota_left = readings.quota_left
+            if responses > self._quota_acted_on and quota_left is not None and quota_left <= self.min_quota:
+                return self._trip('the Spoonacular quota is used up', now)
+            if self.latency is not None and self.latency > self.slow_after:
+                return self._trip('Spoonacular is responding slowly', now)
+        return None
+
+    def _trip(self, reason: str, now: float) -> str:
+        # Everything read so far has been acted on; the probe after the cooldown starts afresh
+        self._tripped_until = now + self.cooldown
+        self._trip_reason = reason
+        self._quota_acted_on = self._responses
+        self.latency = None
+        self.trips += 1
+        return reason
+
+    def stats(self) -> Dict:
+        return {'mode': self.mode, 'offline': self.offline_reason(), 'trips': self.trips,
+                'latency': self.latency, 'quota_left': self.client.readings.quota_left}
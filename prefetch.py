@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List
+import itertools
+import queue
+import threading
+
+
+class Prefetcher:
+    # Background workers that warm recipe details the user is likely to open next.
+    # Lower priority values run first; any foreground fetch in progress holds every worker back.
+    def __init__(self, fetch: Callable[[List[int]], Dict], is_cached: Callable[[int], bool],
+                 budget: Callable[[], float], min_budget: float = 5, workers: int = 2, max_queued: int = 100,
+                 batch_size: int = 10, remember: int = 10000):
+        self.fetch = fetch
+        self.is_cached = is_cached
+        self.budget = budget
+        self.min_budget = min_budget
+        self.batch_size = batch_size
+        self.remember = remember
+        self.queue: queue.PriorityQueue = queue.PriorityQueue(maxsize=max_queued)
+        self._order = itertools.count()
+        self._foreground = 0
+        self._idle = threading.Condition()
+        self._lock = threading.Lock()
+        self._queued = set()
+        # Recipes warmed by prefetch and not opened yet, oldest first
+        self._prefetched: OrderedDict = OrderedDict()
+        self.enqueued = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.prefetched = 0
+        self.failed = 0
+        self.hits = 0
+        self.misses = 0
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True).start()
+
+    def submit(self, recipe_ids: Iterable[int]) -> int:
+        # Queue recipes in rank order; the newest search outranks older ones at the same rank
+        order = next(self._order)
+        added = 0
+        for rank, recipe_id in enumerate(recipe_ids):
+            with self._lock:
+                if recipe_id in self._queued or recipe_id in self._prefetched:
+                    continue
+            if self.is_cached(recipe_id):
+                continue
+            try:
+                self.queue.put_nowait((rank, -order, recipe_id))
+            except queue.Full:
+                self.dropped += 1
+                continue
+            with self._lock:
+                self._queued.add(recipe_id)
+            added += 1
+        self.enqueued += added
+        return added
+
+    @contextmanager
+    def foreground(self):
+        # Wrap user-facing upstream work so prefetch never competes with it
+        with self._idle:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._foreground -= 1
+                if not self._foreground:
+                    self._idle.notify_all()
+
+    def cancel(self) -> int:
+        # Drop everything still queued, e.g. when the rate budget runs low
+        cancelled = 0
+        while True:
+            try:
+                _, _, recipe_id = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._queued.discard(recipe_id)
+            self.queue.task_done()
+            cancelled += 1
+        self.cancelled += cancelled
+        return cancelled
+
+    def record_access(self, recipe_id: int, cached: bool):
+        # Called when a user opens a recipe: a hit if prefetch got there first
+        with self._lock:
+            if self._prefetched.pop(recipe_id, None) is not None and cached:
+                self.hits += 1
+            elif not cached:
+                self.misses += 1
+
+    def _take_batch(self) -> List[int]:
+        batch = [self.queue.get()[2]]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait()[2])
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                with self._idle:
+                    self._idle.wait_for(lambda: not self._foreground)
+                if self.budget() < self.min_budget:
+                    self.cancelled += len(batch)
+                    self.cancel()
+                    continue
+                pending = [recipe_id for recipe_id in batch if not self.is_cached(recipe_id)]
+                if pending:
+                    fetched = self.fetch(pending)
+                    self._remember(fetched)
+                    self.failed += len(set(pending) - set(fetched))
+            except Exception:
+                self.failed += len(batch)
+            finally:
+                with self._lock:
+                    self._queued.difference_update(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _remember(self, recipe_ids: Iterable[int]):
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._prefetched[recipe_id] = True
+                self.prefetched += 1
+            while len(self._prefetched) > self.remember:
+                self._prefetched.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        opened = self.hits + self.misses
+        return {
+            'enqueued': self.enqueued,
+            'queued': self.queue.qsize(),
+            'prefetched': self.prefetched,
+            'dropped': self.dropped,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / opened if opened else 0.0,
+            'used_ratio': self.hits / self.prefetched if self.prefetched else 0.0,
+        }
@@ -0,0 +1,54 @@
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+import threading
+import time
+
+
+def folded_stack(frame) -> str:
+    # One "outer;inner;innermost" line per sample, the collapsed format flamegraph.pl and speedscope read
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    # Samples the stacks of the threads it is asked to watch from a single background thread
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._watching: Dict[int, Counter] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: Optional[int] = None):
+        with self._lock:
+            self._watching[thread_id or threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id: Optional[int] = None) -> Counter:
+        with self._lock:
+            return self._watching.pop(thread_id or threading.get_ident(), Counter())
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._watching:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._watching.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[folded_stack(frame)] += 1
+
+    def dump(self, samples: Counter, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,151 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+import sqlite3
+import threading
+import time
+
+
+class RateLimited(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.throttled = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _take(self, cost: float) -> float:
+        # Returns 0 if the tokens were taken, otherwise how long to wait for them
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def reserve(self, cost: float, waited: float = 0.0, timeout: Optional[float] = None) -> float:
+        # Takes the tokens and returns 0, or returns how long the caller should sleep before retrying
+        with self._lock:
+            wait = self._take(min(cost, self.capacity))
+            if wait == 0:
+                if waited:
+                    self.throttled += 1
+                return 0.0
+            if timeout is not None and waited + wait > timeout:
+                self.rejected += 1
+                raise RateLimited(f"Rate limit budget exhausted, {wait:.2f}s until {cost} tokens are available")
+            return wait
+
+    def acquire(self, cost: float = 1, timeout: Optional[float] = None) -> float:
+        waited = 0.0
+        while True:
+            wait = self.reserve(cost, waited, timeout)
+            if wait == 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def remaining(self) -> float:
+        with self._lock:
+            return min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rate': self.rate,
+            'capacity': self.capacity,
+            'remaining': self.remaining(),
+            'throttled': self.throttled,
+            'rejected': self.rejected,
+        }
+
+
+class SQLiteTokenBucket(TokenBucket):
+    # Same bucket, but the token count lives in SQLite so every worker process draws from one budget
+    def __init__(self, path: Path, rate: float, capacity: float, name: str = 'spoonacular'):
+        super().__init__(rate, capacity)
+        self.name = name
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS token_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('INSERT OR IGNORE INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                           (name, capacity, time.time()))
+
+    def _take(self, cost: float) -> float:
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            tokens, updated = self._conn.execute(
+                'SELECT tokens, updated FROM token_buckets WHERE name = ?', (self.name,)).fetchone()
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            self._conn.execute('UPDATE token_buckets SET tokens = ?, updated = ? WHERE name = ?',
+                               (tokens, now, self.name))
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def remaining(self) -> float:
+        with self._lock:
+            tokens, updated = self._conn.execute(
+                'SELECT tokens, updated FROM token_buckets WHERE name = ?', (self.name,)).fetchone()
+        return min(self.capacity, tokens + max(0.0, time.time() - updated) * self.rate)
+
+
+class SingleFlight:
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        # Concurrent callers with the same key share one execution of func
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {'done': threading.Event()}
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': in_flight}
@@ -0,0 +1,216 @@
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+import threading
+
+from matching import compile_avoid_matcher, singular
+from recipe_model import FLAGS, Recipe, intern_name
+from suggest import PrefixIndex
+
+# Form options spelled the way Spoonacular labels a recipe's diets
+DIET_ALIASES = {
+    'paleo': 'paleolithic',
+    'whole30': 'whole 30',
+    'pescetarian': 'pescatarian',
+    'lacto vegetarian': 'lacto ovo vegetarian',
+    'ovo vegetarian': 'lacto ovo vegetarian',
+}
+# Spoonacular's boolean flags, keyed by the diet/intolerance option they answer
+FLAG_DIETS = dict(zip(('vegetarian', 'vegan', 'gluten free', 'dairy free', 'low fodmap'), FLAGS))
+FLAG_INTOLERANCES = {'dairy': 'dairyFree', 'gluten': 'glutenFree', 'wheat': 'glutenFree'}
+# Ingredients that make a recipe unsafe for an intolerance when no flag says otherwise. They match
+# as words anywhere in an ingredient name, so "egg" also catches "egg yolks"
+INTOLERANCE_TRIGGERS = {
+    'dairy': {'milk', 'cheese', 'butter', 'cream', 'yogurt'},
+    'egg': {'egg'},
+    'gluten': {'flour', 'bread', 'pasta', 'wheat', 'barley', 'rye'},
+    'grain': {'flour', 'bread', 'pasta', 'rice', 'wheat', 'oat', 'corn', 'barley'},
+    'peanut': {'peanut', 'peanut butter'},
+    'seafood': {'fish', 'salmon', 'tuna', 'cod', 'shrimp', 'crab', 'lobster'},
+    'sesame': {'sesame', 'sesame seed', 'tahini', 'sesame oil'},
+    'shellfish': {'shrimp', 'crab', 'lobster', 'clam', 'mussel', 'oyster', 'scallop'},
+    'soy': {'soy sauce', 'tofu', 'soy', 'edamame', 'miso'},
+    'sulfite': {'wine', 'dried fruit', 'vinegar'},
+    'tree nut': {'almond', 'walnut', 'pecan', 'cashew', 'pistachio', 'hazelnut'},
+    'wheat': {'flour', 'bread', 'pasta', 'wheat'},
+}
+INTOLERANCE_MATCHERS = {intolerance: compile_avoid_matcher(triggers)
+                        for intolerance, triggers in INTOLERANCE_TRIGGERS.items()}
+
+
+def normalize_ingredient(name: str) -> str:
+    return singular(' '.join(name.casefold().split()))
+
+
+def normalize_diet(name: str) -> str:
+    name = ' '.join(name.casefold().replace('-', ' ').split())
+    return DIET_ALIASES.get(name, name)
+
+
+def ingredient_keys(name: str) -> Set[str]:
+    # "Bell Peppers" is findable as both "bell pepper" and "pepper"
+    name = normalize_ingredient(name)
+    if not name:
+        return set()
+    return {intern_name(name), intern_name(name.rsplit(' ', 1)[-1])}
+
+
+class Bitset:
+    # Mutable bitset over recipe positions; setting a bit is O(1) however large the index grows
+    def __init__(self):
+        self.data = bytearray()
+
+    def set(self, position: int, value: bool):
+        byte, bit = divmod(position, 8)
+        if byte >= len(self.data):
+            self.data.extend(bytes(byte - len(self.data) + 1))
+        if value:
+            self.data[byte] |= 1 << bit
+        else:
+            self.data[byte] &= ~(1 << bit) & 0xFF
+
+    def to_int(self) -> int:
+        return int.from_bytes(self.data, 'little')
+
+
+class RecipeIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.recipes: Dict[int, Recipe] = {}
+        self.positions: Dict[int, int] = {}
+        self.ingredients: Dict[int, Tuple[str, ...]] = {}
+        # Full ingredient names, for the word matching that avoid terms and intolerances need
+        self.ingredient_names: Dict[int, Tuple[str, ...]] = {}
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        # Bit i is set when the recipe at position i satisfies the diet / is safe for the intolerance
+        self.diet_bits: Dict[str, Bitset] = defaultdict(Bitset)
+        self.safe_bits: Dict[str, Bitset] = defaultdict(Bitset)
+        # Ingredient names for typeahead, counted once per recipe that uses them
+        self.suggestions = PrefixIndex()
+
+    def add(self, recipe: Union[Dict, Recipe]) -> bool:
+        if isinstance(recipe, dict):
+            # Search results without an ingredient list cannot answer ingredient queries
+            if not recipe.get('id') or not recipe.get('extendedIngredients'):
+                return False
+            recipe = Recipe.from_api(recipe)
+        if not recipe.ingredients:
+            return False
+        recipe_id = recipe.id
+        names = set()
+        for ingredient in recipe.ingredients:
+            names |= ingredient_keys(ingredient.name)
+        full_names = tuple(ingredient.name for ingredient in recipe.ingredients)
+
+        with self._lock:
+            if recipe_id in self.positions:
+                self._remove_postings(recipe_id)
+                position = self.positions[recipe_id]
+            else:
+                position = self.positions[recipe_id] = len(self.positions)
+                self.suggestions.update({ingredient.name for ingredient in recipe.ingredients})
+
+            self.recipes[recipe_id] = recipe.listing()
+            self.ingredients[recipe_id] = tuple(names)
+            self.ingredient_names[recipe_id] = full_names
+            for name in names:
+                self.postings[name].add(recipe_id)
+
+            diets = {normalize_diet(diet) for diet in recipe.diets}
+            diets |= {diet for diet, flag in FLAG_DIETS.items() if recipe.flag(flag)}
+            for diet in set(self.diet_bits) | diets:
+                self.diet_bits[diet].set(position, diet in diets)
+
+            for intolerance, matcher in INTOLERANCE_MATCHERS.items():
+                flag = FLAG_INTOLERANCES.get(intolerance)
+                known = recipe.flag(flag) if flag else None
+                safe = known if known is not None else not matcher.excludes_names(recipe.title, full_names)
+                self.safe_bits[intolerance].set(position, bool(safe))
+        return True
+
+    def add_many(self, recipes: Iterable[Union[Dict, Recipe]]) -> int:
+        return sum(self.add(recipe) for recipe in recipes)
+
+    def _remove_postings(self, recipe_id: int):
+        for name in self.ingredients.get(recipe_id, ()):
+            postings = self.postings.get(name)
+            if postings is not None:
+                postings.discard(recipe_id)
+                if not postings:
+                    del self.postings[name]
+
+    def search(self, ingredients: Iterable[str], avoid: Iterable[str], diet: Iterable[str],
+               intolerances: Iterable[str], limit: Optional[int] = None) -> List[Dict]:
+        include = [normalize_ingredient(term) for term in ingredients if term.strip()]
+        avoid = [term for term in avoid if term.strip()]
+        exclude = [normalize_ingredient(term) for term in avoid]
+        with self._lock:
+            if include:
+                # Intersect the rarest ingredient first to keep the working set small
+                postings = sorted((self.postings.get(term, set()) for term in include), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = set(self.recipes)
+            for term in exclude:
+                candidates -= self.postings.get(term, set())
+
+            hits = self._avoiding(sorted(self._allowed(candidates, diet, intolerances)), avoid, limit)
+            return [self.recipes[recipe_id].result() for recipe_id in hits]
+
+    def rank(self, ingredients: Iterable[str], avoid: Iterable[str], diet: Iterable[str],
+             intolerances: Iterable[str], limit: int = 10) -> List[Dict]:
+        # Like search, but a recipe needs only some of the ingredients: most ingredients in common first
+        include = {normalize_ingredient(term) for term in ingredients if term.strip()}
+        avoid = [term for term in avoid if term.strip()]
+        exclude = [normalize_ingredient(term) for term in avoid]
+        with self._lock:
+            overlap: Dict[int, int] = defaultdict(int)
+            for term in include:
+                for recipe_id in self.postings.get(term, ()):
+                    overlap[recipe_id] += 1
+            candidates = set(overlap) if include else set(self.recipes)
+            for term in exclude:
+                candidates -= self.postings.get(term, set())
+
+            ranked = sorted(self._allowed(candidates, diet, intolerances),
+                            key=lambda recipe_id: (-overlap.get(recipe_id, 0), recipe_id))
+            hits = self._avoiding(ranked, avoid, limit)
+            return [dict(self.recipes[recipe_id].result(), matched=overlap.get(recipe_id, 0))
+                    for recipe_id in hits]
+
+    def _avoiding(self, recipe_ids: Iterable[int], avoid: List[str], limit: Optional[int]) -> List[int]:
+        # The exact keys miss "chicken breast" for "chicken" and "bacon" for "pork"; the avoid filter's
+        # word and synonym matching on the full names does not. Stops once limit recipes pass
+        matcher = compile_avoid_matcher(avoid)
+        recipes, names = self.recipes, self.ingredient_names
+        return list(islice((recipe_id for recipe_id in recipe_ids
+                            if not matcher.excludes_names(recipes[recipe_id].title, names[recipe_id])), limit))
+
+    def _allowed(self, candidates: Set[int], diet: Iterable[str], intolerances: Iterable[str]) -> Iterable[int]:
+        masks = [self.diet_bits.get(normalize_diet(name)) for name in diet]
+        masks += [self.safe_bits.get(name.casefold()) for name in intolerances]
+        if not masks:
+            return candidates
+        # AND the bitsets as big integers, then test candidates against the resulting bytes
+        mask = -1
+        for bits in masks:
+            mask &= bits.to_int() if bits is not None else 0
+        allowed = mask.to_bytes(len(self.positions) // 8 + 1, 'little')
+        positions = self.positions
+        return [recipe_id for recipe_id in candidates
+                if allowed[positions[recipe_id] >> 3] >> (positions[recipe_id] & 7) & 1]
+
+    def get(self, recipe_id: int) -> Optional[Dict]:
+        with self._lock:
+            recipe = self.recipes.get(recipe_id)
+            return recipe.result() if recipe is not None else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self.recipes)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'recipes': len(self.recipes), 'ingredients': len(self.postings),
+                    'suggestions': len(self.suggestions),
+                    'diets': sorted(self.diet_bits)}
@@ -0,0 +1,107 @@
+from typing import Any, Dict, Optional, Tuple
+import sys
+
+# Spoonacular's boolean diet flags, one bit each in Recipe.flags / Recipe.known_flags
+FLAGS = ('vegetarian', 'vegan', 'glutenFree', 'dairyFree', 'lowFodmap')
+RESULT_FIELDS = ('id', 'title', 'summary', 'image', 'sourceUrl', 'readyInMinutes', 'servings')
+
+
+def intern_name(name: Optional[str]) -> str:
+    # Ingredient and diet names repeat across thousands of recipes; keep one copy of each
+    return sys.intern(name) if name else ''
+
+
+class Ingredient:
+    __slots__ = ('name', 'original')
+
+    def __init__(self, name: str, original: str):
+        self.name = intern_name(name)
+        self.original = original
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'name': self.name, 'original': self.original}
+
+
+class Recipe:
+    # The fields the pages, the avoid filter and the local index read; everything else in an
+    # /information payload (nutrition, analyzedInstructions, measures, ...) is dropped
+    __slots__ = ('id', 'title', 'summary', 'image', 'sourceUrl', 'readyInMinutes', 'servings', 'instructions',
+                 'ingredients', 'diets', 'flags', 'known_flags')
+
+    def __init__(self, id: int, title: str = '', summary: str = '', image: Optional[str] = None,
+                 sourceUrl: Optional[str] = None, readyInMinutes: Optional[int] = None,
+                 servings: Optional[int] = None, instructions: Optional[str] = None,
+                 ingredients: Tuple[Ingredient, ...] = (), diets: Tuple[str, ...] = (), flags: int = 0,
+                 known_flags: int = 0):
+        self.id = id
+        self.title = title
+        self.summary = summary
+        self.image = image
+        self.sourceUrl = sourceUrl
+        self.readyInMinutes = readyInMinutes
+        self.servings = servings
+        self.instructions = instructions
+        self.ingredients = ingredients
+        self.diets = diets
+        self.flags = flags
+        self.known_flags = known_flags
+
+    @classmethod
+    def from_api(cls, payload: Dict[str, Any]) -> 'Recipe':
+        # Accepts a full Spoonacular payload or the slim dict to_dict() produces
+        flags = known_flags = 0
+        for bit, flag in enumerate(FLAGS):
+            if flag in payload:
+                known_flags |= 1 << bit
+                if payload[flag]:
+                    flags |= 1 << bit
+        return cls(
+            id=int(payload['id']),
+            title=payload.get('title') or '',
+            summary=payload.get('summary') or '',
+            image=payload.get('image'),
+            sourceUrl=payload.get('sourceUrl'),
+            readyInMinutes=payload.get('readyInMinutes'),
+            servings=payload.get('servings'),
+            instructions=payload.get('instructions'),
+            ingredients=tuple(Ingredient(item.get('nameClean') or item.get('name'), item.get('original') or '')
+                              for item in payload.get('extendedIngredients') or ()),
+            diets=tuple(intern_name(diet) for diet in payload.get('diets') or ()),
+            flags=flags,
+            known_flags=known_flags,
+        )
+
+    def flag(self, name: str) -> Optional[bool]:
+        # None when the payload did not say either way
+        bit = 1 << FLAGS.index(name)
+        return bool(self.flags & bit) if self.known_flags & bit else None
+
+    def listing(self) -> 'Recipe':
+        # A copy without instructions and ingredient lines, for holding search results only
+        return Recipe(self.id, self.title, self.summary, self.image, self.sourceUrl, self.readyInMinutes,
+                      self.servings, diets=self.diets, flags=self.flags, known_flags=self.known_flags)
+
+    def result(self) -> Dict[str, Any]:
+        # The shape a search result row is rendered and serialized in
+        row = {'id': self.id, 'title': self.title, 'summary': self.summary}
+        for field in RESULT_FIELDS[3:]:
+            value = getattr(self, field)
+            if value is not None:
+                row[field] = value
+        return row
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Spoonacular's field names, so templates and the avoid filter read it like the original payload
+        data = self.result()
+        if self.instructions is not None:
+            data['instructions'] = self.instructions
+        data['extendedIngredients'] = [ingredient.to_dict() for ingredient in self.ingredients]
+        data['diets'] = list(self.diets)
+        for bit, flag in enumerate(FLAGS):
+            if self.known_flags & 1 << bit:
+                data[flag] = bool(self.flags & 1 << bit)
+        return data
+
+
+def slim(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return Recipe.from_api(payload).to_dict()
@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+import json
+import sqlite3
+import threading
+import time
+
+from cache import pack, unpack
+
+
+def load_details(value) -> Dict:
+    # Rows written before details were packed hold JSON text
+    return json.loads(value) if isinstance(value, str) else unpack(value)
+
+
+class RecipeStore:
+    def __init__(self, path: Path, fresh_for: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.fresh_for = fresh_for
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS recipes (
+                id INTEGER PRIMARY KEY,
+                details TEXT NOT NULL,
+                summary TEXT,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, recipe_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT details, summary, fetched_at FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'details': load_details(row[0]),
+            'summary': row[1],
+            'fetched_at': row[2],
+            'stale': time.time() - row[2] > self.fresh_for,
+        }
+
+    def put(self, recipe_id: int, details: Dict, summary: Optional[str]) -> float:
+        fetched_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO recipes (id, details, summary, fetched_at) VALUES (?, ?, ?, ?)',
+                (recipe_id, pack(details), summary, fetched_at))
+            self._conn.commit()
+        return fetched_at
+
+    def delete(self, recipe_id: int):
+        with self._lock:
+            self._conn.execute('DELETE FROM recipes WHERE id = ?', (recipe_id,))
+            self._conn.commit()
+
+    def missing(self, recipe_ids: Iterable[int]) -> List[int]:
+        wanted = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+        if not wanted:
+            return []
+        with self._lock:
+            placeholders = ','.join('?' * len(wanted))
+            present = {row[0] for row in self._conn.execute(
+                f'SELECT id FROM recipes WHERE id IN ({placeholders})', wanted)}
+        return [recipe_id for recipe_id in wanted if recipe_id not in present]
+
+    def iter_details(self, batch_size: int = 500) -> Iterator[Dict]:
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT id, details FROM recipes WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for last_id, details in rows:
+                yield load_details(details)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM recipes').fetchone()[0]
@@ -0,0 +1,98 @@
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import threading
+import time
+
+from saved_searches import SavedSearchStore
+
+logger = logging.getLogger(__name__)
+
+
+class SavedSearchRefresher:
+    # Re-runs each saved search about once per period, one at a time and spread evenly across it,
+    # and fetches details only for the recipes a re-run turns up that were not there before
+    def __init__(self, store: SavedSearchStore, search: Callable[[Dict], List[Dict]],
+                 fetch_details: Callable[[List[int]], Dict], budget: Callable[[], float],
+                 period: float = 24 * 3600, min_budget: float = 20, min_interval: float = 60,
+                 available: Callable[[], bool] = lambda: True):
+        self.store = store
+        self.search = search
+        self.fetch_details = fetch_details
+        self.budget = budget
+        self.period = period
+        self.min_budget = min_budget
+        self.min_interval = min_interval
+        self.available = available
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshed = 0
+        self.changed = 0
+        self.added = 0
+        self.deferred = 0
+        self.failed = 0
+        self.last_run: Optional[float] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='saved-search-refresh', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def interval(self) -> float:
+        # One search per tick, so a full pass over every saved search takes about one period
+        return max(self.min_interval, self.period / max(len(self.store), 1))
+
+    def _run(self):
+        while not self._stop.wait(self.interval()):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Saved search refresh failed: {e}")
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        # Leave the rate budget to users when it runs low, and wait out upstream outages;
+        # the search stays due for the next tick
+        if not self.available() or self.budget() < self.min_budget:
+            self.deferred += 1
+            return None
+        name = self.store.claim_refresh(time.time() - self.period)
+        if name is None:
+            return None
+        return self.refresh(name)
+
+    def refresh(self, name: str) -> Optional[Dict[str, Any]]:
+        saved = self.store.get(name)
+        if saved is None:
+            return None
+        self.last_run = time.time()
+        delta = self.store.refresh_recipes(name, self.search(saved))
+        if delta is None:
+            return None
+        self.refreshed += 1
+        if delta['added'] or delta['removed']:
+            self.changed += 1
+            self.added += len(delta['added'])
+            if delta['added']:
+                self.fetch_details(delta['added'])
+            logger.info(f"Saved search {name!r}: {len(delta['added'])} new, {len(delta['removed'])} gone")
+        return dict(delta, name=name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self._thread is not None and not self._stop.is_set(),
+            'period': self.period,
+            'interval': self.interval(),
+            'refreshed': self.refreshed,
+            'changed': self.changed,
+            'added': self.added,
+            'deferred': self.deferred,
+            'failed': self.failed,
+            'last_run': self.last_run,
+        }
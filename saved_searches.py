@@ -0,0 +1,282 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import base64
+import json
+import sqlite3
+import threading
+import time
+
+FIELDS = ('ingredients', 'avoid', 'diet', 'intolerances')
+SORT_COLUMNS = {'name': 'name', 'created': 'created_at', 'updated': 'updated_at'}
+
+
+class SavedSearchStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._cache: Optional[Dict[str, Dict]] = None
+        self._data_version = None
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS saved_searches (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS saved_search_terms (
+                name TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                term TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS saved_search_terms_lookup ON saved_search_terms (kind, term);
+            CREATE INDEX IF NOT EXISTS saved_search_terms_name ON saved_search_terms (name);
+            CREATE TABLE IF NOT EXISTS saved_search_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            INSERT OR IGNORE INTO saved_search_meta (key, value) VALUES ('revision', 0);
+            CREATE TABLE IF NOT EXISTS saved_search_refresh (
+                name TEXT PRIMARY KEY,
+                refreshed_at REAL,
+                claimed_at REAL,
+                viewed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS saved_search_changes (
+                name TEXT NOT NULL,
+                changed_at REAL NOT NULL,
+                added TEXT NOT NULL,
+                removed TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS saved_search_changes_name ON saved_search_changes (name, changed_at);
+        ''')
+
+    def migrate_from_json(self, json_path: Path) -> int:
+        # Imports the legacy saved_searches.json once; later runs are no-ops
+        json_path = Path(json_path)
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM saved_search_meta WHERE key = 'json_migrated'").fetchone()
+        if done or not json_path.exists():
+            return 0
+        with open(json_path, 'r') as f:
+            searches = json.load(f)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for name, data in searches.items():
+                    self._upsert(name, data)
+                self._conn.execute("INSERT OR REPLACE INTO saved_search_meta (key, value) VALUES ('json_migrated', ?)",
+                                   (str(json_path),))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._cache = None
+        return len(searches)
+
+    def _upsert(self, name: str, data: Dict):
+        now = time.time()
+        self._conn.execute('''
+            INSERT INTO saved_searches (name, data, created_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+        ''', (name, json.dumps(data), now, now))
+        self._bump_revision()
+        self._conn.execute('DELETE FROM saved_search_terms WHERE name = ?', (name,))
+        self._conn.executemany(
+            'INSERT INTO saved_search_terms (name, kind, term) VALUES (?, ?, ?)',
+            {(name, kind, term.strip().casefold()) for kind in FIELDS for term in data.get(kind) or []})
+
+    def _bump_revision(self):
+        self._conn.execute("UPDATE saved_search_meta SET value = value + 1 WHERE key = 'revision'")
+
+    def revision(self) -> int:
+        # Changes on every write, so it can stand in for a version of the whole collection
+        with self._lock:
+            return int(self._conn.execute("SELECT value FROM saved_search_meta WHERE key = 'revision'").fetchone()[0])
+
+    def upsert(self, name: str, data: Dict):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._upsert(name, data)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._cache = None
+
+    def refresh_recipes(self, name: str, recipes: List[Dict], keep_changes: int = 50) -> Optional[Dict]:
+        # Store the recipes of a re-run and record which ids appeared or dropped out since the last one.
+        # Read and write in one transaction so an edit made by another worker in between is not lost
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT data FROM saved_searches WHERE name = ?', (name,)).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+                data = json.loads(row[0])
+                old_ids = [recipe.get('id') for recipe in data.get('recipes') or []]
+                new_ids = [recipe['id'] for recipe in recipes]
+                known, current = set(old_ids), set(new_ids)
+                added = [recipe_id for recipe_id in new_ids if recipe_id not in known]
+                removed = [recipe_id for recipe_id in old_ids if recipe_id not in current]
+                if added or removed:
+                    self._upsert(name, dict(data, recipes=recipes))
+                    self._conn.execute(
+                        'INSERT INTO saved_search_changes (name, changed_at, added, removed) VALUES (?, ?, ?, ?)',
+                        (name, now, json.dumps(added), json.dumps(removed)))
+                    self._conn.execute('''
+                        DELETE FROM saved_search_changes WHERE name = ? AND rowid NOT IN (
+                            SELECT rowid FROM saved_search_changes WHERE name = ? ORDER BY changed_at DESC LIMIT ?)
+                    ''', (name, name, keep_changes))
+                self._conn.execute('''
+                    INSERT INTO saved_search_refresh (name, refreshed_at) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET refreshed_at = excluded.refreshed_at, claimed_at = NULL
+                ''', (name, now))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._cache = None
+        return {'added': added, 'removed': removed, 'refreshed_at': now}
+
+    def claim_refresh(self, stale_before: float, claim_for: float = 600) -> Optional[str]:
+        # Hands out the search refreshed longest ago; other workers pass over it while the claim lasts
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('''
+                    SELECT s.name FROM saved_searches s LEFT JOIN saved_search_refresh r ON r.name = s.name
+                    WHERE COALESCE(r.refreshed_at, 0) < ? AND COALESCE(r.claimed_at, 0) < ?
+                    ORDER BY COALESCE(r.refreshed_at, 0), s.name
+                    LIMIT 1
+                ''', (stale_before, now - claim_for)).fetchone()
+                if row is not None:
+                    self._conn.execute('''
+                        INSERT INTO saved_search_refresh (name, claimed_at) VALUES (?, ?)
+                        ON CONFLICT (name) DO UPDATE SET claimed_at = excluded.claimed_at
+                    ''', (row[0], now))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return row[0] if row is not None else None
+
+    def mark_viewed(self, name: str) -> Dict:
+        # Recipe ids added by refreshes since the previous view, then records this view
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT refreshed_at, viewed_at FROM saved_search_refresh WHERE name = ?', (name,)).fetchone()
+                refreshed_at, viewed_at = row if row is not None else (None, None)
+                added = {}
+                for (ids,) in self._conn.execute(
+                        'SELECT added FROM saved_search_changes WHERE name = ? AND changed_at > ? ORDER BY changed_at',
+                        (name, viewed_at or 0)):
+                    added.update(dict.fromkeys(json.loads(ids)))
+                self._conn.execute('''
+                    INSERT INTO saved_search_refresh (name, viewed_at) VALUES (?, ?)
+                    ON CONFLICT (name) DO UPDATE SET viewed_at = excluded.viewed_at
+                ''', (name, now))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return {'refreshed_at': refreshed_at, 'last_viewed_at': viewed_at, 'added': list(added)}
+
+    def delete(self, name: str) -> bool:
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('DELETE FROM saved_search_terms WHERE name = ?', (name,))
+                self._conn.execute('DELETE FROM saved_search_refresh WHERE name = ?', (name,))
+                self._conn.execute('DELETE FROM saved_search_changes WHERE name = ?', (name,))
+                deleted = self._conn.execute('DELETE FROM saved_searches WHERE name = ?', (name,)).rowcount
+                self._bump_revision()
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._cache = None
+        return bool(deleted)
+
+    def _load(self) -> Dict[str, Dict]:
+        # data_version changes whenever another connection (e.g. another worker) commits
+        version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if self._cache is None or version != self._data_version:
+            self._cache = {name: json.loads(data) for name, data in
+                           self._conn.execute('SELECT name, data FROM saved_searches ORDER BY name')}
+            self._data_version = version
+        return self._cache
+
+    def all(self) -> Dict[str, Dict]:
+        with self._lock:
+            return dict(self._load())
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            return self._load().get(name)
+
+    def find(self, kind: str, term: str) -> List[str]:
+        if kind not in FIELDS:
+            raise ValueError(f"Unknown saved search field: {kind}")
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                'SELECT DISTINCT name FROM saved_search_terms WHERE kind = ? AND term = ? ORDER BY name',
+                (kind, term.strip().casefold()))]
+
+    def list(self, prefix: str = '', sort: str = 'name', descending: bool = False, limit: int = 50,
+             cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        column = SORT_COLUMNS[sort]
+        direction = 'DESC' if descending else 'ASC'
+        comparison = '<' if descending else '>'
+
+        where, args = [], []
+        if prefix:
+            where.append('name >= ? AND name < ?')
+            args += [prefix, prefix + chr(0x10FFFF)]
+        if cursor:
+            # Keyset pagination: continue strictly after the last row of the previous page
+            last_value, last_name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            where.append(f'({column}, name) {comparison} (?, ?)')
+            args += [last_value, last_name]
+
+        rows = []
+        with self._lock:
+            for name, created_at, updated_at, ingredient_count, recipe_count in self._conn.execute(f'''
+                SELECT name, created_at, updated_at,
+                       COALESCE(json_array_length(data, '$.ingredients'), 0),
+                       COALESCE(json_array_length(data, '$.recipes'), 0)
+                FROM saved_searches
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY {column} {direction}, name {direction}
+                LIMIT ?
+            ''', args + [limit + 1]):
+                rows.append({
+                    'name': name,
+                    'created_at': created_at,
+                    'updated_at': updated_at,
+                    'ingredient_count': ingredient_count,
+                    'recipe_count': recipe_count,
+                })
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps([last[column], last['name']]).encode()).decode()
+        return rows, next_cursor
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
@@ -0,0 +1,52 @@
+from typing import Optional
+import secrets
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from cache import TTLCache
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid: Optional[str] = None, new: bool = False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    # Only a random session id travels in the cookie; the data lives in a TTLCache backend
+    def __init__(self, store: TTLCache):
+        self.store = store
+
+    def open_session(self, app, request) -> ServerSession:
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(16), new=True)
+
+    def save_session(self, app, session: ServerSession, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        self.store.set(session.sid, dict(session), ttl=lifetime)
+        response.set_cookie(name, session.sid, max_age=int(lifetime), httponly=self.get_cookie_httponly(app),
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+                            domain=domain, path=path)
+        response.vary.add('Cookie')
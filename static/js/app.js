@@ -0,0 +1,133 @@
+$(document).ready(function() {
+    // Ingredients come from /suggest as you type, so only names the server knows can be picked
+    $('.select2-multi').select2({
+        placeholder: "Select or type ingredients",
+        ajax: {
+            url: '/suggest',
+            dataType: 'json',
+            delay: 150,  // wait for a pause in typing before asking
+            cache: true,
+            data: function(params) {
+                return {q: params.term || '', limit: 30};
+            }
+        }
+    });
+
+    // Saved searches may hold ingredients that are not options of the picker yet
+    function selectValues(select, values) {
+        (values || []).forEach(function(value) {
+            if (!select.find('option').filter(function() { return this.value === value; }).length) {
+                select.append(new Option(value, value, false, false));
+            }
+        });
+        select.val(values).trigger('change');
+    }
+    $('.select2-dropdown').select2({
+        placeholder: "Select options"
+    });
+
+    // Mode toggle
+    function setMode(mode) {
+        if (mode === 'light') {
+            $('body').addClass('light-mode');
+            localStorage.setItem('mode', 'light');
+            $('#mode-toggle').prop('checked', false);
+        } else {
+            $('body').removeClass('light-mode');
+            localStorage.setItem('mode', 'dark');
+            $('#mode-toggle').prop('checked', true);
+        }
+    }
+
+    // Check localStorage for saved mode
+    var savedMode = localStorage.getItem('mode') || 'dark';
+    setMode(savedMode);
+
+    // Mode toggle event listener
+    $('#mode-toggle').change(function() {
+        setMode(this.checked ? 'dark' : 'light');
+    });
+
+    // Clear All button
+    $('#clear-all').click(function() {
+        $('.select2-multi, .select2-dropdown').val(null).trigger('change');
+        $('#search-name').val('');
+        // Clear results section
+        $('.results-section').html('');
+        // Clear session data
+        $.post('/clear_session');
+        // Hide saved searches list if it's visible
+        $('#saved-searches-list').hide();
+    });
+
+     // Save Search button
+    $('#save-search').click(function() {
+        var searchData = {
+            name: $('#search-name').val() || 'Unnamed Search',
+            ingredients: $('#ingredients').val(),
+            avoid: $('#avoid').val(),
+            diet: $('#diet').val(),
+            intolerances: $('#intolerances').val(),
+            recipes: []  // This will be populated with recipe data
+        };
+
+        // Collect recipe data
+        $('.recipe-item').each(function() {
+            searchData.recipes.push({
+                title: $(this).find('.recipe-title').text(),
+                summary: $(this).find('.recipe-summary').text(),
+                id: $(this).data('recipe-id')
+            });
+        });
+
+        $.ajax({
+            url: '/save_search',
+            type: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify(searchData),
+            success: function(response) {
+                alert('Search saved successfully!');
+            },
+            error: function(error) {
+                alert('Error saving search: ' + error.responseText);
+            }
+        });
+    });
+    // Load Saved Searches button
+    $('#load-saved-searches').click(function() {
+        var names = [];
+        function loadPage(cursor) {
+            $.get('/get_saved_searches', {limit: 200, cursor: cursor || ''}, function(data) {
+                data.searches.forEach(function(search) {
+                    names.push(search.name);
+                });
+                if (data.next_cursor) {
+                    loadPage(data.next_cursor);
+                    return;
+                }
+                var select = $('<select id="saved-search-select"></select>');
+                names.forEach(function(name) {
+                    select.append($('<option></option>').val(name).text(name));
+                });
+                $('#saved-searches-list').empty().append(select)
+                    .append('<button id="load-selected-search">Load Selected Search</button>');
+                $('#saved-searches-list').show();
+            });
+        }
+        loadPage();
+    });
+
+    // Load Selected Search button
+    $(document).on('click', '#load-selected-search', function() {
+        var selectedSearch = $('#saved-search-select').val();
+        $.get('/load_saved_search/' + encodeURIComponent(selectedSearch), function(data) {
+            $('#search-name').val(selectedSearch);
+            selectValues($('#ingredients'), data.ingredients);
+            selectValues($('#avoid'), data.avoid);
+            $('#diet').val(data.diet).trigger('change');
+            $('#intolerances').val(data.intolerances).trigger('change');
+            var fresh = (data.new_since_last_view || []).length;
+            alert('Search loaded successfully!' + (fresh ? ' ' + fresh + ' new recipes since your last visit.' : ''));
+        });
+    });
+});
@@ -0,0 +1,20 @@
+$(document).ready(function() {
+    function setMode(mode) {
+        if (mode === 'light') {
+            $('body').addClass('light-mode');
+            localStorage.setItem('mode', 'light');
+            $('#mode-toggle').prop('checked', false);
+        } else {
+            $('body').removeClass('light-mode');
+            localStorage.setItem('mode', 'dark');
+            $('#mode-toggle').prop('checked', true);
+        }
+    }
+
+    var savedMode = localStorage.getItem('mode') || 'dark';
+    setMode(savedMode);
+
+    $('#mode-toggle').change(function() {
+        setMode(this.checked ? 'dark' : 'light');
+    });
+});
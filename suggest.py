@@ -0,0 +1,65 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List
+import heapq
+import threading
+
+
+def fold(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+def load_vocabulary(path: Path) -> List[str]:
+    # One ingredient per line; blank lines and "#" comments are skipped
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+class PrefixIndex:
+    # Terms in a sorted array searched with bisect. Every word of a term is a key of its own,
+    # so "pep" finds "bell pepper" as well as "pepper"; matches are ranked by count
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.keys: List[str] = []
+        self.terms: List[str] = []
+        self.counts: Counter = Counter()
+
+    def add(self, term: str, count: int = 1):
+        self.update([term], count)
+
+    def update(self, terms: Iterable[str], count: int = 1):
+        with self._lock:
+            for term in terms:
+                term = fold(term)
+                if not term:
+                    continue
+                if term not in self.counts:
+                    for key in self._word_keys(term):
+                        position = bisect_right(self.keys, key)
+                        self.keys.insert(position, key)
+                        self.terms.insert(position, term)
+                self.counts[term] += count
+
+    def _word_keys(self, term: str) -> List[str]:
+        words = term.split(' ')
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + chr(0x10FFFF), start)
+            matches = set(self.terms[start:end])
+            counts = self.counts
+            # Most frequent first, then the shorter (more general) term
+            return heapq.nsmallest(limit, matches, key=lambda term: (-counts[term], len(term), term))
+
+    def __len__(self):
+        with self._lock:
+            return len(self.counts)
@@ -0,0 +1,48 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_spoonacular import FakeSpoonacular
+
+
+@pytest.fixture
+def fake_spoonacular():
+    server = FakeSpoonacular(corpus_size=200).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app_settings(tmp_path, fake_spoonacular):
+    # Every store in tmp_path, the fake Spoonacular upstream, and no background work
+    return {
+        'API_KEY': 'test',
+        'SECRET_KEY': 'test',
+        'SPOONACULAR_URL': fake_spoonacular.url,
+        'SPOONACULAR_RATE': 1000.0,
+        'SPOONACULAR_BURST': 1000.0,
+        'SEARCH_CACHE_PATH': tmp_path / 'search_cache.sqlite3',
+        'SUMMARY_CACHE_PATH': tmp_path / 'summary_cache.sqlite3',
+        'RECIPE_STORE_PATH': tmp_path / 'recipes.sqlite3',
+        'SAVED_SEARCHES_PATH': tmp_path / 'saved_searches.sqlite3',
+        'SESSION_PATH': tmp_path / 'sessions.sqlite3',
+        'SAVED_SEARCH_REFRESH_PERIOD': 0,
+        'PREFETCH_TOP_K': 0,
+        'WARM_ON_START': False,
+    }
+
+
+@pytest.fixture
+def make_app(app_settings):
+    import app as recipehunter
+
+    def make(**overrides):
+        recipehunter.reset_services(keep=())
+        return recipehunter.create_app(dict(app_settings, TESTING=True, **overrides))
+
+    yield make
+    recipehunter.reset_services(keep=())
@@ -0,0 +1,113 @@
+import asyncio
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def asgi(app_settings, monkeypatch):
+    # asgi.py builds its app from the environment at import time
+    import app as recipehunter
+
+    for name, value in app_settings.items():
+        monkeypatch.setenv(name, ('1' if value else '0') if isinstance(value, bool) else str(value))
+    recipehunter.reset_services(keep=())
+    monkeypatch.delitem(sys.modules, 'asgi', raising=False)
+    import asgi
+    yield asgi
+    recipehunter.reset_services(keep=())
+
+
+def get(asgi, *paths, **kwargs):
+    return send(asgi, lambda client: [client.get(path, **kwargs) for path in paths], concurrently=False)
+
+
+def send(asgi, requests, concurrently=True):
+    async def fetch():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            pending = requests(client)
+            responses = await asyncio.gather(*pending) if concurrently else [await request for request in pending]
+        # The upstream client is bound to this event loop, which asyncio.run closes
+        if asgi.client is not None:
+            await asgi.client.aclose()
+            asgi.client = None
+        return responses
+    return asyncio.run(fetch())
+
+
+def test_search_api_shares_the_search_cache(asgi, fake_spoonacular):
+    # One page holds every match, so no look-ahead request for the next page races the assertions
+    first, second = get(asgi, '/api/search', '/api/search', params={'ingredients': 'onions', 'number': 100})
+    assert first.status_code == second.status_code == 200
+    expected = fake_spoonacular.search({'includeIngredients': ['onions'], 'number': ['100']})['results']
+    assert 10 < len(expected) < 100
+    assert [recipe['id'] for recipe in first.json()['recipes']] == [recipe['id'] for recipe in expected]
+    assert second.json() == first.json()
+    assert fake_spoonacular.calls['complexSearch'] == 1
+    # The async client reports to the readings the offline health check watches
+    assert asgi.spoonacular._resolve().readings.responses == 1
+
+
+def test_recipe_page_is_fetched_once_then_served_from_the_store(asgi, fake_spoonacular):
+    first, second = get(asgi, '/recipe/1', '/recipe/1')
+    assert first.status_code == second.status_code == 200
+    assert fake_spoonacular.recipes[1]['title'] in first.text
+    assert dict(fake_spoonacular.calls) == {'information': 1}
+
+
+def test_missing_recipe_is_a_404(asgi):
+    response, = get(asgi, '/recipe/99999')
+    assert response.status_code == 404
+    assert 'warning' not in response.headers
+
+
+def test_sqlite_calls_stay_off_the_event_loop(asgi, monkeypatch):
+    import app as recipehunter
+
+    threads = []
+
+    def recording(get):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return get(*args, **kwargs)
+        return wrapper
+
+    for service in (recipehunter.search_cache, recipehunter.recipe_store):
+        instance = service._resolve()
+        monkeypatch.setattr(instance, 'get', recording(instance.get))
+    get(asgi, '/api/search', params={'ingredients': 'onions', 'number': 100})
+    get(asgi, '/recipe/1')
+    assert threads
+    assert threading.main_thread() not in threads
+
+
+def test_recipe_page_gets_the_same_http_caching_as_wsgi(asgi):
+    first, = get(asgi, '/recipe/1', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'public, max-age=86400, stale-while-revalidate=604800'
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'].endswith('-gzip"')
+    assert 'Accept-Encoding' in first.headers['Vary']
+
+    again, = get(asgi, '/recipe/1', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.content == b''
+
+
+def test_home_page_searches_run_concurrently(asgi, fake_spoonacular):
+    asgi.app.config['LOCAL_SEARCH'] = False
+    fake_spoonacular.latency = 0.3
+    ingredients = ['onions', 'garlic', 'rice', 'beef', 'pasta', 'eggs']
+    started = time.perf_counter()
+    responses = send(asgi, lambda client: [client.post('/', data={'ingredients': [ingredient]})
+                                           for ingredient in ingredients])
+    elapsed = time.perf_counter() - started
+    assert [response.status_code for response in responses] == [200] * len(ingredients)
+    assert all('An error occurred' not in response.text for response in responses)
+    assert fake_spoonacular.calls['complexSearch'] == len(ingredients)
+    # One after another would take at least 6 * 0.3s
+    assert elapsed < 1.2
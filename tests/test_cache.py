@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from cache import canonical_query, make_cache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make(request, tmp_path):
+    def make(**kwargs):
+        return make_cache(request.param, path=tmp_path / 'cache.sqlite3', **kwargs)
+    return make
+
+
+def test_canonical_query_ignores_order_case_and_duplicates():
+    assert (canonical_query(['Beef', ' onion', 'beef '], ['Nuts'], ['vegan'], [])
+            == canonical_query(['onion', 'beef'], ['nuts'], ['Vegan'], []))
+
+
+def test_canonical_query_keeps_fields_apart():
+    assert canonical_query(['beef'], [], [], []) != canonical_query([], ['beef'], [], [])
+    assert canonical_query(['beef'], [], [], [], number=10) != canonical_query(['beef'], [], [], [], number=20)
+
+
+def test_entries_expire_after_their_ttl(make):
+    cache = make(ttl=0.05)
+    cache.set('key', {'results': [1]})
+    assert cache.get('key') == {'results': [1]}
+    time.sleep(0.1)
+    assert cache.get('key') is None
+    # Expired entries are still there for the stale fallback
+    assert cache.get_stale('key') == {'results': [1]}
+
+
+def test_least_recently_used_entry_is_evicted(make):
+    cache = make(max_entries=3)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key)
+    cache.get('a')
+    cache.set('d', 'd')
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in ('a', 'c', 'd')] == ['a', 'c', 'd']
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['entries'] == 3
+
+
+def test_expired_entries_are_evicted_first(make):
+    cache = make(max_entries=2)
+    cache.set('old', 'old', ttl=-1)
+    cache.set('a', 'a')
+    cache.set('b', 'b')
+    assert cache.get_stale('old') is None
+    assert [cache.get(key) for key in ('a', 'b')] == ['a', 'b']
+
+
+def test_hits_and_misses_are_counted(make):
+    cache = make()
+    assert cache.get('key') is None
+    cache.set('key', 'value')
+    assert cache.get('key') == 'value'
+    assert cache.get('key') == 'value'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+    assert stats['hit_ratio'] == pytest.approx(2 / 3)
+    cache.clear()
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+
+
+def test_repeated_search_is_answered_from_the_cache(make_app, fake_spoonacular):
+    client = make_app(LOCAL_SEARCH=False).test_client()
+    for ingredients in (['onion', 'garlic'], ['Garlic', 'onion']):
+        assert client.post('/', data={'ingredients': ingredients}).status_code == 200
+    assert fake_spoonacular.calls['complexSearch'] == 1
+
+    import app as recipehunter
+    stats = recipehunter.search_cache.stats()
+    assert stats['hits'] >= 1
+    assert stats['hit_ratio'] > 0
+
+
+def test_shared_backend_forgets_entries_it_evicts(tmp_path):
+    cache = make_cache('shared', path=tmp_path / 'cache.sqlite3', max_entries=3)
+    cache.set('k', 'value')
+    assert cache.get('k') == 'value'
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key)
+    assert cache.stats()['evictions'] == 1
+    assert cache.get('k') is None
+    assert cache.get_stale('k') is None
+
+
+def test_shared_backend_forgets_entries_evicted_for_size(tmp_path):
+    cache = make_cache('shared', path=tmp_path / 'cache.sqlite3', max_entries=1000, max_bytes=4000)
+    cache.set('k', 'value')
+    assert cache.get('k') == 'value'
+    for number in range(100):
+        cache.set(f"key {number}", f"{number:040d}")
+    assert cache.stats()['evictions'] > 0
+    assert cache.get('k') is None
+    assert cache.get('key 99') == f"{99:040d}"
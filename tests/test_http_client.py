@@ -0,0 +1,95 @@
+from email.utils import formatdate
+import time
+
+import pytest
+import requests
+
+from http_client import CircuitBreaker, SpoonacularClient, UpstreamUnavailable, parse_retry_after
+
+
+def make_client(fake_spoonacular, **kwargs) -> SpoonacularClient:
+    kwargs.setdefault('backoff_base', 0)
+    return SpoonacularClient(fake_spoonacular.url, **kwargs)
+
+
+def test_failed_calls_are_retried_until_they_succeed(fake_spoonacular):
+    fake_spoonacular.error_rate = 0.5
+    client = make_client(fake_spoonacular, max_retries=10, breaker=CircuitBreaker(failure_threshold=100))
+    for recipe_id in range(1, 21):
+        assert client.get(f"recipes/{recipe_id}/information")['id'] == recipe_id
+    assert client.retries > 0
+    assert fake_spoonacular.requests == 20 + client.retries
+
+
+def test_retries_stop_after_max_retries(fake_spoonacular):
+    fake_spoonacular.error_rate = 1
+    client = make_client(fake_spoonacular, max_retries=2)
+    with pytest.raises(requests.HTTPError):
+        client.get('recipes/1/information')
+    assert client.retries == 2
+    assert fake_spoonacular.requests == 3
+
+
+def test_backoff_is_bounded():
+    client = SpoonacularClient(backoff_base=0.25, backoff_max=1)
+    for attempt in range(10):
+        assert 0 <= client.backoff(attempt) <= min(1, 0.25 * 2 ** attempt)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2') == 2
+    assert parse_retry_after('-5') == 0
+    assert parse_retry_after(formatdate(time.time() + 60, usegmt=True)) == pytest.approx(60, abs=2)
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_after_beyond_the_limit_is_not_waited_out(fake_spoonacular):
+    # The fake asks for Retry-After: 0, which is already too long here
+    fake_spoonacular.error_rate = 1
+    client = make_client(fake_spoonacular, max_retries=5, retry_after_max=-1)
+    with pytest.raises(requests.HTTPError):
+        client.get('recipes/1/information')
+    assert fake_spoonacular.requests == 1
+
+
+def test_slow_responses_time_out(fake_spoonacular):
+    fake_spoonacular.latency = 0.3
+    client = make_client(fake_spoonacular, max_retries=1, timeout=0.05)
+    with pytest.raises(requests.Timeout):
+        client.get('recipes/1/information')
+    assert client.retries == 1
+    assert client.breaker.failures == 2
+
+
+def test_circuit_opens_after_repeated_failures_and_closes_on_success(fake_spoonacular):
+    fake_spoonacular.error_rate = 1
+    client = make_client(fake_spoonacular, max_retries=0,
+                         breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.get('recipes/1/information')
+    assert client.breaker.state == 'open'
+    with pytest.raises(UpstreamUnavailable):
+        client.get('recipes/1/information')
+    assert fake_spoonacular.requests == 2
+
+    time.sleep(0.15)
+    assert client.breaker.state == 'half-open'
+    fake_spoonacular.error_rate = 0
+    assert client.get('recipes/1/information')['id'] == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_search_falls_back_to_stale_results(make_app, fake_spoonacular):
+    # Entries expire as soon as they are written, so every search after the first goes upstream again
+    client = make_app(LOCAL_SEARCH=False, SEARCH_CACHE_TTL=-1, SPOONACULAR_MAX_RETRIES=0).test_client()
+    fresh = client.post('/', data={'ingredients': ['onions']})
+    assert fresh.status_code == 200
+
+    fake_spoonacular.error_rate = 1
+    stale = client.post('/', data={'ingredients': ['onions']})
+    assert stale.status_code == 200
+    assert 'An error occurred' not in stale.text
+    titles = [recipe['title'] for recipe in fake_spoonacular.search({'includeIngredients': ['onions']})['results']]
+    assert titles and all(title in stale.text for title in titles)
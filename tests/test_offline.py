@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from async_api import AsyncSpoonacularClient
+from http_client import SpoonacularClient
+from offline import UpstreamHealth
+
+
+@pytest.fixture
+def recipehunter(make_app):
+    make_app(OFFLINE_COOLDOWN=0.05, OFFLINE_SLOW_AFTER=1.0)
+    import app as recipehunter
+    return recipehunter
+
+
+def respond(client, seconds=0.01, quota_left=None):
+    # What the client records for one Spoonacular response
+    client.readings.record_latency(seconds)
+    if quota_left is not None:
+        client.readings.quota_left = quota_left
+
+
+def test_spent_quota_trips_again_after_the_cooldown(recipehunter):
+    health, client = recipehunter.upstream_health, recipehunter.spoonacular._resolve()
+    assert health.offline_reason() is None
+
+    respond(client, quota_left=0)
+    assert health.offline_reason() == 'the Spoonacular quota is used up'
+    time.sleep(0.06)
+    # No response since the trip, so the next call goes out as the health check
+    assert health.offline_reason() is None
+
+    respond(client, quota_left=0)
+    assert health.offline_reason() == 'the Spoonacular quota is used up'
+    assert health.trips == 2
+
+    time.sleep(0.06)
+    respond(client, quota_left=150)
+    assert health.offline_reason() is None
+
+
+def test_slow_responses_trip_again_after_the_cooldown(recipehunter):
+    health, client = recipehunter.upstream_health, recipehunter.spoonacular._resolve()
+    respond(client, seconds=5)
+    assert health.offline_reason() == 'Spoonacular is responding slowly'
+    time.sleep(0.06)
+    assert health.offline_reason() is None
+
+    respond(client, seconds=5)
+    assert health.offline_reason() == 'Spoonacular is responding slowly'
+    assert health.trips == 2
+
+    # One fast probe is enough to come back
+    time.sleep(0.06)
+    respond(client, seconds=0.01)
+    assert health.offline_reason() is None
+
+
+def test_searches_are_served_locally_while_spoonacular_is_slow(make_app, fake_spoonacular):
+    client = make_app(OFFLINE_SLOW_AFTER=0.05, LOCAL_SEARCH=False).test_client()
+    fake_spoonacular.latency = 0.1
+    assert 'Warning' not in client.post('/', data={'ingredients': ['beef']}).headers
+    calls = fake_spoonacular.requests
+
+    response = client.post('/', data={'ingredients': ['rice']})
+    assert response.headers['Warning'] == '110 - "Response is Stale"'
+    assert 'Spoonacular is responding slowly' in response.text
+    assert fake_spoonacular.requests == calls
+
+
+def test_the_async_client_feeds_the_same_health_check(fake_spoonacular):
+    client = SpoonacularClient(fake_spoonacular.url)
+    health = UpstreamHealth(client, slow_after=0.05)
+    fake_spoonacular.latency = 0.1
+
+    async def fetch():
+        async_client = AsyncSpoonacularClient(fake_spoonacular.url, breaker=client.breaker, readings=client.readings)
+        try:
+            await async_client.get('recipes/1/information')
+        finally:
+            await async_client.aclose()
+
+    asyncio.run(fetch())
+    assert client.readings.responses == 1
+    assert health.offline_reason() == 'Spoonacular is responding slowly'
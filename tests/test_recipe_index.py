@@ -0,0 +1,64 @@
+import pytest
+
+from recipe_index import RecipeIndex
+
+
+def recipe(recipe_id, title, *ingredients, **flags):
+    return dict(flags, id=recipe_id, title=title, summary='',
+                extendedIngredients=[{'name': name, 'original': name} for name in ingredients])
+
+
+@pytest.fixture
+def index():
+    index = RecipeIndex()
+    index.add_many([
+        recipe(1, 'Chicken Rice Bowl', 'chicken breast', 'rice'),
+        recipe(2, 'Fried Rice', 'bacon', 'rice', 'green onions'),
+        recipe(3, 'Almond Rice Cakes', 'almond flour', 'rice'),
+        recipe(4, 'Rice Pudding', 'egg yolks', 'rice', 'sugar'),
+        recipe(5, 'Salmon Poke', 'salmon fillet', 'rice'),
+        recipe(6, 'Sesame Noodles', 'sesame paste', 'rice'),
+        recipe(7, 'Plain Rice', 'rice', 'salt'),
+    ])
+    return index
+
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+
+@pytest.mark.parametrize('avoid, excluded', [
+    (['chicken'], 1),
+    (['pork'], 2),
+    (['onion'], 2),
+    (['almonds'], 3),
+])
+def test_avoided_ingredients_match_inside_longer_names(index, avoid, excluded):
+    assert excluded not in ids(index.search(['rice'], avoid, [], []))
+    assert excluded not in ids(index.rank(['rice'], avoid, [], []))
+    assert excluded in ids(index.search(['rice'], [], [], []))
+
+
+@pytest.mark.parametrize('intolerance, unsafe', [
+    ('Tree Nut', 3),
+    ('Egg', 4),
+    ('Seafood', 5),
+    ('Sesame', 6),
+])
+def test_intolerance_triggers_match_inside_longer_names(index, intolerance, unsafe):
+    assert ids(index.search(['rice'], [], [], [intolerance])) == [recipe_id for recipe_id in range(1, 8)
+                                                                  if recipe_id != unsafe]
+    assert unsafe not in ids(index.rank(['rice'], [], [], [intolerance], limit=10))
+
+
+def test_flags_overrule_trigger_matching(index):
+    index.add(recipe(8, 'Vegan Butter Rice', 'vegan butter', 'rice', dairyFree=True))
+    index.add(recipe(9, 'Butter Rice', 'butter', 'rice'))
+    safe = ids(index.search(['rice'], [], [], ['Dairy']))
+    assert 8 in safe
+    assert 9 not in safe
+
+
+def test_search_stops_at_the_limit(index):
+    assert ids(index.search(['rice'], ['chicken'], [], [], limit=3)) == [2, 3, 4]
+    assert ids(index.rank(['rice', 'salt'], ['chicken'], [], [], limit=2)) == [7, 2]
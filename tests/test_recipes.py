@@ -0,0 +1,43 @@
+def test_cold_detail_page_costs_one_upstream_call(make_app, fake_spoonacular):
+    client = make_app().test_client()
+    response = client.get('/recipe/1')
+    assert response.status_code == 200
+    assert fake_spoonacular.recipes[1]['title'] in response.text
+    assert dict(fake_spoonacular.calls) == {'information': 1}
+
+
+def test_summary_is_fetched_when_information_has_none(make_app, fake_spoonacular):
+    fake_spoonacular.recipes[1]['summary'] = ''
+    client = make_app().test_client()
+    assert client.get('/recipe/1').status_code == 200
+    assert dict(fake_spoonacular.calls) == {'information': 1, 'summary': 1}
+
+
+def test_missing_recipe_is_a_404_not_an_outage(make_app, fake_spoonacular):
+    client = make_app(SPOONACULAR_MAX_RETRIES=0).test_client()
+    response = client.get('/recipe/99999')
+    assert response.status_code == 404
+    assert 'Warning' not in response.headers
+    assert 'Recipe not found' in response.text
+
+
+def test_upstream_errors_show_the_unavailable_page(make_app, fake_spoonacular):
+    fake_spoonacular.error_rate = 1
+    client = make_app(SPOONACULAR_MAX_RETRIES=0).test_client()
+    response = client.get('/recipe/1')
+    assert response.status_code == 503
+    assert response.headers['Warning'] == '110 - "Response is Stale"'
+
+
+def test_recipe_page_etag_changes_with_its_assets(make_app, monkeypatch):
+    import app as recipehunter
+    client = make_app().test_client()
+    first = client.get('/recipe/1')
+    assert client.get('/recipe/1', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    # A new recipe.css or recipe.js means new asset URLs in the page, so the old copy must not be revalidated
+    monkeypatch.setattr(recipehunter, 'asset_hash', lambda filename: 'changed')
+    again = client.get('/recipe/1', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
+    assert 'css/recipe.css?v=changed' in again.text
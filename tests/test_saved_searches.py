@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def client(make_app, fake_spoonacular):
+    # The local index already knows every recipe, so ordinary searches never need Spoonacular
+    app = make_app()
+    import app as recipehunter
+    recipehunter.recipe_index.add_many(fake_spoonacular.recipes.values())
+    client = app.test_client()
+    client.post('/save_search', json={'name': 'dinner', 'ingredients': ['onions'], 'avoid': [], 'diet': [],
+                                      'intolerances': [], 'recipes': []})
+    return client
+
+
+def batch(client, body):
+    response = client.post('/search/batch', json=body)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def upstream_ids(fake_spoonacular, ingredients, number=10):
+    results = fake_spoonacular.search({'includeIngredients': [','.join(ingredients)], 'number': [str(number)]})
+    return [recipe['id'] for recipe in results['results']]
+
+
+def test_plain_batch_queries_are_answered_locally(client, fake_spoonacular):
+    lines = batch(client, {'queries': [{'ingredients': ['onions']}]})
+    assert len(lines[0]['recipes']) == 10
+    assert fake_spoonacular.calls['complexSearch'] == 0
+
+
+def test_saved_searches_in_a_batch_are_refreshed_from_spoonacular(client, fake_spoonacular):
+    lines = batch(client, {'saved': ['dinner']})
+    assert fake_spoonacular.calls['complexSearch'] >= 1
+    assert lines[0]['names'] == ['dinner']
+    assert [recipe['id'] for recipe in lines[0]['recipes']] == upstream_ids(fake_spoonacular, ['onions'])
+
+    saved = client.get('/load_saved_search/dinner').get_json()
+    assert [recipe['id'] for recipe in saved['recipes']] == upstream_ids(fake_spoonacular, ['onions'])
+
+
+def test_saved_searches_are_not_overwritten_when_spoonacular_fails(client, fake_spoonacular):
+    fake_spoonacular.error_rate = 1
+    lines = batch(client, {'saved': ['dinner']})
+    assert 'error' in lines[0]
+    assert client.get('/load_saved_search/dinner').get_json()['recipes'] == []
+
+
+def test_background_refresh_asks_spoonacular_even_when_the_index_could_answer(client, fake_spoonacular):
+    import app as recipehunter
+    delta = recipehunter.saved_search_refresher.refresh('dinner')
+    assert fake_spoonacular.calls['complexSearch'] >= 1
+    assert delta['added'] == upstream_ids(fake_spoonacular, ['onions'])
+
+    # Nothing changed upstream, so a second refresh finds nothing new or gone
+    delta = recipehunter.saved_search_refresher.refresh('dinner')
+    assert delta['added'] == delta['removed'] == []
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'queries': [{'ingredients': 'beef'}]}, 'Invalid query: ingredients must be a list'),
+    ({'queries': {'ingredients': ['beef']}}, 'queries must be a list'),
+    ({'saved': 'dinner'}, 'saved must be true or a list of names'),
+])
+def test_batch_rejects_fields_that_are_not_lists(client, fake_spoonacular, body, error):
+    response = client.post('/search/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+    assert fake_spoonacular.calls['complexSearch'] == 0
+
+
+def test_saved_searches_count_towards_the_batch_limit(client, fake_spoonacular):
+    import app as recipehunter
+    recipehunter.config['BATCH_MAX_QUERIES'] = 1
+    response = client.post('/search/batch', json={'queries': [{'ingredients': ['beef']}], 'saved': True})
+    assert response.status_code == 400
+    assert fake_spoonacular.calls['complexSearch'] == 0
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from matching import compile_avoid_matcher
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(LOCAL_SEARCH=False).test_client()
+
+
+def stream(client, **params):
+    lines = [json.loads(line) for line in client.get('/search/stream', query_string=params).text.splitlines()]
+    return [line['recipe']['id'] for line in lines[:-1]], lines[-1]
+
+
+def test_a_full_first_page_does_not_fetch_the_next(client, fake_spoonacular):
+    assert fake_spoonacular.search({'includeIngredients': ['onions']})['totalResults'] > 10
+    response = client.post('/', data={'ingredients': ['onions']})
+    assert response.status_code == 200
+    assert fake_spoonacular.calls['complexSearch'] == 1
+
+
+def test_short_pages_keep_paging_until_enough_recipes_survive(make_app, fake_spoonacular):
+    import app as recipehunter
+    make_app(LOCAL_SEARCH=False)
+    recipes = list(recipehunter.iter_search_results([], ['stew'], [], [], 'test', count=10))
+    matcher = compile_avoid_matcher(['stew'])
+    expected = [recipe['id'] for recipe in fake_spoonacular.recipes.values() if not matcher.excludes(recipe)]
+    assert [recipe['id'] for recipe in recipes] == expected[:10]
+    assert fake_spoonacular.calls['complexSearch'] == 2
+
+
+def test_stream_resumes_after_the_last_recipe_sent(client, fake_spoonacular):
+    matcher = compile_avoid_matcher(['stew'])
+    expected = [recipe['id'] for recipe in fake_spoonacular.recipes.values() if not matcher.excludes(recipe)]
+
+    seen, offset, done = [], 0, False
+    while not done:
+        ids, last = stream(client, avoid='stew', count=10, offset=offset)
+        assert len(ids) == 10 or last['done']
+        seen += ids
+        offset, done = last['next_offset'], last['done']
+    assert seen == expected